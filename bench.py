@@ -0,0 +1,840 @@
+#region Bench
+#
+# offline benchmarks, no emulator, mouse or keyboard needed:
+#   "python bench.py"                      every benchmark
+#   "python bench.py pipeline --rate 1000" synthetic input through Reactor/Mapper/Adb per backend
+# a failed check (a timer over the jitter budget, a lost release, a wrong match) makes the exit status 1
+#
+#endregion
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+
+import tweaker
+from fake_adb import FakeAdbServer, FAKE_SERIAL, read_log
+
+# checks that went wrong, the exit status once every bench has run
+failures = []
+
+def fail(message):
+    failures.append(message)
+    print(message)
+
+def report(name, n, seconds):
+    print(f"{name:<32} {n:>8} ops {seconds * 1000:>10.2f} ms {n / seconds:>12.0f} ops/s {seconds / n * 1e6:>10.2f} us/op")
+
+def wait_received(server, service, size, timeout=10):
+    deadline = time.perf_counter() + timeout
+    while len(server.received(service)) < size:
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"{service}: {len(server.received(service))}/{size} bytes")
+        time.sleep(0.001)
+
+def bench_client(args):
+    n = args.n
+    server = FakeAdbServer().start()
+    client = tweaker.AdbClient(port=server.port)
+    try:
+        t = time.perf_counter()
+        for i in range(n):
+            client.version()
+        report("host:version", n, time.perf_counter() - t)
+
+        t = time.perf_counter()
+        for i in range(n):
+            client.shell(FAKE_SERIAL, "getevent -pl")
+        report("shell:getevent -pl", n, time.perf_counter() - t)
+
+        line = b"sendevent /dev/input/event4 3 53 234\n"
+        stream = client.stream(FAKE_SERIAL, "exec:sh")
+        t = time.perf_counter()
+        for i in range(n):
+            stream.write(line)
+            stream.flush()
+        wait_received(server, "exec:sh", len(line) * n)
+        report("pooled exec:sh write", n, time.perf_counter() - t)
+    finally:
+        client.close()
+        server.stop()
+
+def bench_config(port, profiles, **adb):
+    config = {
+        "name": "bench",
+        "window": {"title": "bench", "resolution": "2400x1080", "rect": [0, 0, 2400, 1080]},
+        "adb": {"path": "adb", "ip_port": FAKE_SERIAL, "client": "socket", "server_port": port, "profiles": profiles},
+        "player": {"x": 0.5, "y": 0.5},
+        "keys": {"s": "pad 0.5 0.5", "1": "click 0.2 0.08", "w": "swipe 0.5 0.5 0.6 0.5"},
+    }
+    config["adb"].update(adb)
+    return config
+
+def bench_startup(args):
+    n = args.n
+    # launch to "Start Running...", against the fake adb server
+    server = FakeAdbServer().start()
+    root = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "configs.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump([bench_config(server.port, os.path.join(tmp, "profiles.json"))], f)
+        samples = []
+        for i in range(min(n, 20)):
+            t = time.perf_counter()
+            p = subprocess.Popen(
+                [sys.executable, "-u", os.path.join(root, "tweaker.py"), "--config", path],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+            try:
+                for line in p.stdout:
+                    if line.startswith("Start Running..."):
+                        samples.append(time.perf_counter() - t)
+                        break
+                else:
+                    raise RuntimeError("tweaker exited before \"Start Running...\"")
+            finally:
+                p.kill()
+                p.wait()
+        samples.sort()
+        print(f"startup: min {samples[0] * 1000:.1f} ms, median {samples[len(samples) // 2] * 1000:.1f} ms, max {samples[-1] * 1000:.1f} ms")
+    server.stop()
+
+class NullAdb:
+    screen_width = 2400
+    screen_height = 1080
+
+    def point(self, x, y):
+        return (int(x * self.screen_width), int(y * self.screen_height))
+
+    def point_diff(self, x, y, x_diff, y_diff):
+        x, y = self.point(x, y)
+        return (x, y, x + int(x_diff * 270), y + int(y_diff * 270))
+
+    def joystick(self, key, x, y):
+        pass
+
+    def execute(self, fn, *args, origin=None):
+        pass
+
+def legacy_format_key(vk, ctrl, shift, alt):
+    # the f-string path Desktop.__format_key / Reactor.__unformat_key used before the dispatch table
+    if vk >= 0x70 and vk <= 0x7B:
+        return "F" + str(vk - 0x6F)
+    fk = ""
+    if ctrl:
+        fk += "C"
+    if shift:
+        fk += "S"
+    if alt:
+        fk += "A"
+    if vk >= 0x30 and vk <= 0x39:
+        fk += str(vk - 0x30)
+    elif vk >= 0x41 and vk <= 0x5A:
+        fk += chr(vk + 0x20)
+    else:
+        return None
+    return fk
+
+def legacy_dispatch(adb, keys, fk):
+    for prefix in "CSAF":
+        if fk.startswith(prefix):
+            fk = fk[1:]
+    act = keys.get(fk)
+    if act is None:
+        return
+    act_type = act[0]
+    if act_type == "click":
+        adb.execute("click", act[1], act[2])
+    elif act_type == "swipe":
+        adb.execute("swipe", act[1], act[2], act[3], act[4])
+    elif act_type == "swipe_direction":
+        adb.execute("swipe_diff", act[1], act[2], act[3], act[4])
+    elif act_type == "swipe_area":
+        adb.execute("swipe_area", act[1], act[2])
+    elif act_type == "pad":
+        adb.execute("touch_end", "s")
+
+def bench_dispatch(args):
+    n = args.n
+    adb = NullAdb()
+    config = bench_config(0, None)
+    mapper = tweaker.Mapper(config)
+    mapper.compile(adb)
+    vks = [0x53, 0x31, 0x57, 0x51, 0x45, 0x52, 0x4B] * (n // 7 + 1)
+    vks = vks[:n]
+
+    t = time.perf_counter()
+    for vk in vks:
+        fk = legacy_format_key(vk, False, False, False)
+        if fk is not None:
+            legacy_dispatch(adb, mapper.keys, fk)
+    report("dispatch: string path", n, time.perf_counter() - t)
+
+    table = mapper.table
+    t = time.perf_counter()
+    for vk in vks:
+        act = table[vk << 3]
+        if act is not None:
+            act()
+    report("dispatch: compiled table", n, time.perf_counter() - t)
+
+    # targets side by side, the first two mirrored as a group: a key held while the pointer crosses
+    # into the other group is released where it was pressed
+    class Target:
+        def __init__(self, left, right, group):
+            self.left, self.right = left, right
+            self.tick_hz = 0
+            self.group = group
+            self.config = config
+            self.got = []
+
+        def contains(self, x, y):
+            return self.left <= x < self.right
+
+        def mirror(self, x, y, other):
+            return x - self.left + other.left, y
+
+        def dispatch(self, t, mods, vk, x, y, ts):
+            self.got.append((t, vk))
+
+    for route in ["focus", "broadcast"]:
+        targets = [Target(0, 1000, "a"), Target(1000, 2000, "a"), Target(2000, 3000, "b")]
+        router = tweaker.Router(targets, route)
+        router.dispatch(tweaker.MSG_MOVE, 0, 0, 500, 500, 0)
+        router.dispatch(tweaker.MSG_KEY_DOWN, 0, 0x57, 500, 500, 0)
+        router.dispatch(tweaker.MSG_MOVE, 0, 0, 2500, 500, 0)
+        router.dispatch(tweaker.MSG_KEY_UP, 0, 0x57, 2500, 500, 0)
+        ups = [i for i in range(3) if (tweaker.MSG_KEY_UP, 0x57) in targets[i].got]
+        downs = [i for i in range(3) if (tweaker.MSG_KEY_DOWN, 0x57) in targets[i].got]
+        if ups != downs:
+            fail(f"dispatch: {route} routing pressed a key on targets {downs}, released it on {ups}")
+        else:
+            print(f"dispatch: {route} routing releases keys where they were pressed")
+
+def bench_geometry(args):
+    n = args.n
+    left, top, right, bottom = 100, 50, 2500, 1130
+    abs_affine = (0, -1079, 1079, 2399, 0, 0)
+    points = [(left + (i * 37) % (right - left), top + (i * 53) % (bottom - top)) for i in range(n)]
+
+    win = types.SimpleNamespace(left=left, top=top, right=right, bottom=bottom, width=right - left, height=bottom - top)
+    t = time.perf_counter()
+    for x, y in points:
+        # the per-event path Reactor.__act_mouse and Adb.abs_coord took before the cached transform
+        if x <= win.left or x >= win.right or y <= win.top or y >= win.bottom:
+            continue
+        fx = float(x - win.left) / float(win.width)
+        fy = float(y - win.top) / float(win.height)
+        vx = fx - 0.5
+        vy = fy - 0.5
+        # the pointer vector was normalized on every event too
+        sr = math.sqrt(vx ** 2 + vy ** 2)
+        if sr >= 0.001:
+            vx, vy = vx / sr, vy / sr
+        rx, ry = 1 - fy, fx
+        ax, ay = int(0 + rx * (1079 - 0)), int(0 + ry * (2399 - 0))
+    report("geometry: per-event math", n, time.perf_counter() - t)
+
+    transform = tweaker.Transform(left, top, right, bottom, abs_affine)
+    t = time.perf_counter()
+    for x, y in points:
+        if not transform.contains(x, y):
+            continue
+        fx, fy = transform.frac(x, y)
+        ax, ay = transform.to_abs(x, y)
+    report("geometry: cached transform", n, time.perf_counter() - t)
+
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    t = time.perf_counter()
+    transform.map_batch(xs, ys)
+    report("geometry: batch, lists", n, time.perf_counter() - t)
+    try:
+        import numpy as np
+    except ImportError:
+        print("geometry: batch, numpy              skipped, numpy is not installed")
+        return
+    xs = np.array(xs, dtype="float64")
+    ys = np.array(ys, dtype="float64")
+    t = time.perf_counter()
+    transform.map_batch(xs, ys)
+    report("geometry: batch, numpy", n, time.perf_counter() - t)
+
+def bench_stick(args):
+    # steady aiming: the pointer drifts slowly around the player with a little hand jitter
+    n = args.n
+    samples = []
+    a = 0.0
+    for i in range(n):
+        a += 0.002
+        jitter = 0.02 * math.sin(i * 1.7)
+        samples.append((math.cos(a) * (0.8 + jitter), math.sin(a) * (0.8 + jitter)))
+
+    t = time.perf_counter()
+    frames = 0
+    last = None
+    for x, y in samples:
+        # the hard-coded pad: unit vector, radius 50, a frame whenever the rounded position moved
+        sr = math.hypot(x, y)
+        pos = (0xea - int(y / sr * 50), 0x1d7 + int(x / sr * 50))
+        if pos != last:
+            last = pos
+            frames += 1
+    report(f"stick: legacy pad, {frames} frames", n, time.perf_counter() - t)
+
+    stick = tweaker.Joystick(lambda x, y: (int(x * 1079), int(y * 2399)), 0.2, 0.78, 0.05, 0.1)
+    t = time.perf_counter()
+    frames = 0
+    for x, y in samples:
+        if stick.update(x, y) is not None:
+            frames += 1
+    report(f"stick: joystick, {frames} frames", n, time.perf_counter() - t)
+
+    # what TouchEngine merges into one report: the touch-down alone, then one position per axis per slot
+    sent = []
+    touch = tweaker.TouchEngine(10, 65535, sent.append)
+    touch.down("pad", 539, 1199)
+    touch.move("pad", 539, 1259)
+    touch.down("fire", 900, 300)
+    touch.move("pad", 560, 1300)
+    touch.commit()
+    ABS, SLOT, ID, X, Y, SYN = tweaker.EV_ABS, tweaker.ABS_MT_SLOT, tweaker.ABS_MT_TRACKING_ID, tweaker.ABS_MT_POSITION_X, tweaker.ABS_MT_POSITION_Y, tweaker.EV_SYN
+    expected = [
+        [(ABS, SLOT, 0), (ABS, ID, 1), (ABS, X, 539), (ABS, Y, 1199), (SYN, 0, 0)],
+        [(ABS, Y, 1300), (ABS, SLOT, 1), (ABS, ID, 2), (ABS, X, 900), (ABS, Y, 300), (ABS, SLOT, 0), (ABS, X, 560), (SYN, 0, 0)],
+    ]
+    if sent != expected:
+        fail(f"stick: touch frames {sent}")
+    else:
+        print("stick: touch-downs land in their own report, later moves overwrite pending ones")
+
+def bench_look(args):
+    # a 1 kHz mouse flicking left and right for n ms, fed to mouse-look per event and per 120 Hz tick
+    n = args.n
+    path = []
+    x = 0.0
+    for i in range(n):
+        x += 0.004 * math.sin(i / 40)
+        path.append((x, 0.0005 * i))
+    for label, every in [("per event", 1), ("per tick", 1000 // 120)]:
+        look = tweaker.MouseLook(lambda x, y: (int(x * 32767), int(y * 32767)), 0.7, 0.5, 0.045, 0.1)
+        ops = 0
+        recenters = 0
+        t = time.perf_counter()
+        for i in range(every - 1, n, every):
+            for fn, pos in look.update(*path[i]):
+                ops += 1
+                if fn == "touch_end":
+                    recenters += 1
+        report(f"look: {label}, {ops} touches, {recenters} recenters", n, time.perf_counter() - t)
+
+    # the frames a 120 Hz look run sends: the finger must travel the whole motion, a touch-down merged with
+    # the move after it would land at the moved point and drop that stretch
+    server = FakeAdbServer().start()
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        adb = tweaker.Adb(bench_config(server.port, os.path.join(tmp, "profiles.json"), client="socket", backend="binary"))
+        adb.look_toggle("look", 0.7, 0.5)
+    frames = []
+    adb.touch.send = frames.append
+    every = 1000 // 120
+    for i in range(every - 1, n, every):
+        adb.look_to("look", *path[i])
+        adb.touch.commit()
+    server.stop()
+    travelled = look_travel(frames)
+    x0, y0 = adb.abs_coord(0.7, 0.5)
+    x1, y1 = adb.abs_coord(0.7 + path[i][0], 0.5 + path[i][1])
+    strokes = len([1 for events in frames for t, c, v in events if c == tweaker.ABS_MT_TRACKING_ID and v >= 0])
+    if abs(travelled[0] - (x1 - x0)) > 2 * strokes or abs(travelled[1] - (y1 - y0)) > 2 * strokes:
+        fail(f"look: the finger travelled {travelled}, the pointer {(x1 - x0, y1 - y0)} over {strokes} strokes")
+    else:
+        print(f"look: the finger travels the pointer's motion over {strokes} strokes")
+
+def look_travel(frames):
+    # TouchEngine frames -> (x, y) the fingers moved while down, the jumps of touch-downs left out
+    travelled = [0, 0]
+    slot = 0
+    pos = {}
+    landed = set()
+    for events in frames:
+        landed.clear()
+        for t, c, v in events:
+            if c == tweaker.ABS_MT_SLOT:
+                slot = v
+            elif c == tweaker.ABS_MT_TRACKING_ID:
+                if v >= 0:
+                    landed.add(slot)
+                    pos[slot] = [0, 0]
+                else:
+                    pos.pop(slot, None)
+            elif c == tweaker.ABS_MT_POSITION_X or c == tweaker.ABS_MT_POSITION_Y:
+                axis = 0 if c == tweaker.ABS_MT_POSITION_X else 1
+                if slot in pos and slot not in landed:
+                    travelled[axis] += v - pos[slot][axis]
+                if slot in pos:
+                    pos[slot][axis] = v
+    return tuple(travelled)
+
+def timer_jitter(n, load, on_loop=False):
+    # lateness of n one-shot timers spread over half a second, with load busy threads competing for the GIL,
+    # on the wheel thread or as event loop timers
+    loop = None
+    if on_loop:
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        wheel = tweaker.LoopTimers(loop)
+    else:
+        wheel = tweaker.TimerWheel()
+    late = tweaker.Histogram()
+    done = threading.Event()
+    stop = threading.Event()
+    fired = [0]
+
+    def burn():
+        while not stop.is_set():
+            sum(range(1000))
+
+    def fire(due):
+        late.add(max(0.0, time.perf_counter() - due))
+        fired[0] += 1
+        if fired[0] == n:
+            done.set()
+
+    burners = [threading.Thread(target=burn, daemon=True) for i in range(load)]
+    for t in burners:
+        t.start()
+    ticker = wheel.call_every(0.01, lambda: None)
+    start = time.perf_counter() + 0.05
+    for i in range(n):
+        due = start + (i * 7919 % n) / n * 0.5
+        wheel.call_at(due, fire, due)
+    done.wait(10)
+    ticker.cancel()
+    stop.set()
+    if loop is not None:
+        loop.call_soon_threadsafe(loop.stop)
+    return late
+
+def timer_idle_late():
+    # a wheel left empty for an hour, how late its next timer fires
+    wheel = tweaker.TimerWheel()
+    wheel.origin -= 3600
+    done = threading.Event()
+    late = []
+    due = time.perf_counter() + 0.01
+
+    def fire():
+        late.append(time.perf_counter() - due)
+        done.set()
+
+    wheel.call_at(due, fire)
+    done.wait(10)
+    return late[0] if len(late) > 0 else None
+
+def bench_timers(args):
+    budget = args.jitter_ms
+    interval = sys.getswitchinterval()
+    for on_loop in [False, True]:
+        # the switch interval tweaker.py runs with, "--sync" for the wheel and the default for the asyncio core
+        sys.setswitchinterval(interval if on_loop else 0.001)
+        for load in [0, 1]:
+            late = timer_jitter(min(args.n, 2000), load, on_loop)
+            p50 = late.percentile(50) * 1000
+            p99 = late.percentile(99) * 1000
+            label = f"{'loop' if on_loop else 'wheel'}, {load} busy threads"
+            line = f"timers: {label:<24} {late.n:>8} fired  p50 {p50:>6.2f} ms  p99 {p99:>6.2f} ms"
+            if p99 > budget or late.n < min(args.n, 2000):
+                fail(f"{line}  over the {budget} ms budget" if p99 > budget else f"{line}  timers never fired")
+            else:
+                print(f"{line}  ok")
+    sys.setswitchinterval(interval)
+    late = timer_idle_late()
+    if late is None or late * 1000 > budget:
+        fail(f"timers: after an hour idle the next timer fired {'never' if late is None else f'{late * 1000:.2f} ms late'}")
+    else:
+        print(f"timers: {'wheel, an hour idle':<24} {1:>8} fired  {late * 1000:.2f} ms late")
+
+def overload_run(depth, press_deadline, stall):
+    # 1 kHz stick moves and a tap every 20 ms for 3 s, the device takes no writes from 0.5 s for stall seconds;
+    # what gets delivered once it is back, and how late
+    start = time.perf_counter()
+    buffered = []
+    delivered = []
+
+    def run(fn, args):
+        buffered.append((fn, args[-1]))
+
+    def flush():
+        now = time.perf_counter()
+        if start + 0.5 <= now < start + 0.5 + stall:
+            return False
+        delivered.extend([(fn, now - stamp) for fn, stamp in buffered])
+        buffered.clear()
+        return True
+
+    scheduler = tweaker.AdbScheduler(run, flush, depth=depth, press_deadline=press_deadline)
+    sent = {"tap": 0, "touch_end": 0}
+    for i in range(3000):
+        due = start + i / 1000
+        while time.perf_counter() < due:
+            time.sleep(0.0002)
+        now = time.perf_counter()
+        scheduler.put("stick_move", ("pad", now), tweaker.TASK_MOVE, "pad")
+        if i % 20 == 0:
+            scheduler.put("tap", (i, now), tweaker.TASK_PRESS, i)
+            scheduler.put("touch_end", (i, now), tweaker.TASK_RELEASE, i)
+            sent["tap"] += 1
+            sent["touch_end"] += 1
+    scheduler.wait_idle()
+    return sent, delivered, scheduler.stats()
+
+def bench_overload(args):
+    stall = args.stall_ms / 1000
+    print(f"overload: device stalled for {args.stall_ms:.0f} ms")
+    print(f"{'depth/press deadline':<22} {'taps':>9} {'releases':>9} {'late taps':>10} {'max age ms':>11}")
+    runs = []
+    for depth, press_deadline in [(1 << 20, 0), (64, 0), (64, 0.25)]:
+        sent, delivered, stats = overload_run(depth, press_deadline, stall)
+        taps = [age for fn, age in delivered if fn == "tap"]
+        releases = len([1 for fn, age in delivered if fn == "touch_end"])
+        late = len([1 for age in taps if age > 0.25])
+        label = f"{depth if depth < 1 << 20 else 'unbounded'}/{press_deadline * 1000:.0f} ms"
+        print(f"{label:<22} {len(taps):>4}/{sent['tap']:<4} {releases:>4}/{sent['touch_end']:<4} {late:>10} {max(taps) * 1000:>11.0f}")
+        runs.append((label, stats))
+        if releases != sent["touch_end"]:
+            fail(f"overload: {label} lost releases")
+    print(tweaker.overload_report(runs))
+    end = drag_run(stall)
+    if end != (1000, 1919):
+        fail(f"overload: a drag through the stall lifted at {end}, not (1000, 1919)")
+    else:
+        print("overload: drag through the stall lifts at its end point")
+    if stick_release_run(max(stall, 0.3)) != "stick_release":
+        fail("overload: a stick released during a stall stayed down")
+    else:
+        print("overload: stick released during a stall lifts")
+
+def stick_release_run(stall):
+    # a deflected stick released while the device is stalled, past the move deadline: the lift still goes out
+    start = time.perf_counter()
+    ran = []
+
+    def flush():
+        return time.perf_counter() >= start + stall
+
+    scheduler = tweaker.AdbScheduler(lambda fn, args: ran.append((fn, args)), flush)
+    for fn, args in [("stick_move", ("pad", 0.9, 0)), ("stick_move", ("pad", 0.5, 0)), ("stick_release", ("pad",))]:
+        priority, key = tweaker.Adb.TASKS[fn]
+        scheduler.put(fn, args, priority, args[key])
+        time.sleep(0.05)
+    while len(ran) < 3 and time.perf_counter() < start + stall + 5:
+        time.sleep(0.01)
+    return ran[-1][0] if len(ran) > 0 else None
+
+def drag_run(stall):
+    # a raw drag whose last moves and release land while the device is stalled, where the finger is when it lifts
+    start = time.perf_counter()
+    buffered = []
+    touches = []
+
+    def run(fn, args):
+        buffered.append((fn, args))
+
+    def flush():
+        if time.perf_counter() < start + stall:
+            return False
+        touches.extend(buffered)
+        buffered.clear()
+        return True
+
+    scheduler = tweaker.AdbScheduler(run, flush)
+    key = ("gesture", 1)
+    scheduler.put("touch_start", (key, 1000, 1000), tweaker.TASK_PRESS, key)
+    for x, y in tweaker.interpolate(1000, 1000, 1000, 1919, 10, "linear"):
+        scheduler.put("touch_move", (key, x, y), tweaker.TASK_MOVE, key)
+    scheduler.put("touch_end", (key,), tweaker.TASK_RELEASE, key)
+    # idle only means the lane is empty, the stalled flush still holds the batch
+    while not any([fn == "touch_end" for fn, args in touches]) and time.perf_counter() < start + stall + 5:
+        time.sleep(0.01)
+    at = None
+    for fn, args in touches:
+        if fn == "touch_end":
+            return at
+        if fn in ("touch_start", "touch_move"):
+            at = args[1:]
+    return None
+
+def raw_frame(width, height, button, noise=0):
+    # an RGBA screencap frame with the 16 byte header, the button a red block at (0.8, 0.7) - (0.9, 0.8)
+    import numpy
+    pixels = numpy.empty((height, width, 4), numpy.uint8)
+    pixels[:, :] = (40, 60, 80, 255)
+    if button:
+        pixels[int(0.7 * height):int(0.8 * height), int(0.8 * width):int(0.9 * width)] = (200, 40, 40, 255)
+    if noise > 0:
+        jitter = numpy.random.default_rng(1).integers(-noise, noise + 1, pixels.shape)
+        pixels = numpy.clip(pixels.astype(numpy.int16) + jitter, 0, 255).astype(numpy.uint8)
+    return tweaker.RAW_HEADER.pack(width, height, 1) + b"\0\0\0\0" + pixels.tobytes()
+
+def bench_screen(args):
+    try:
+        import numpy
+    except ImportError:
+        print("screen: numpy is not installed, skipped")
+        return
+    import zlib
+    n = min(args.n, 200)
+    on = raw_frame(2400, 1080, True)
+    off = raw_frame(2400, 1080, False)
+    with tempfile.TemporaryDirectory() as tmp:
+        ref = os.path.join(tmp, "button.raw")
+        with open(ref, "wb") as f:
+            f.write(on)
+        fired = []
+        config = {"interval_ms": 0, "regions": {"button": {"rect": [0.8, 0.7, 0.9, 0.8], "ref": ref, "threshold": 16}}}
+        watch = tweaker.ScreenWatch(config, None, lambda fn, args: fired.append(fn))
+    noisy = raw_frame(2400, 1080, True, noise=8)
+    results = [watch.check(on)["button"], watch.check(noisy)["button"], not watch.check(off)["button"]]
+    watch.wait("button", "tap", (0, 0), 1.0)
+    watch.check(off)
+    results.append(len(fired) == 0)
+    watch.check(on)
+    results.append(fired == ["tap"])
+    if all(results):
+        print("screen: matches ok")
+    else:
+        fail(f"screen: matches WRONG {results}")
+
+    # the decode a "screencap -p" frame needs before any pixel can be compared
+    png = zlib.compress(on, 1)
+    t = time.perf_counter()
+    for i in range(n):
+        zlib.decompress(png)
+    report("screen: inflate whole frame", n, time.perf_counter() - t)
+    t = time.perf_counter()
+    for i in range(n):
+        numpy.frombuffer(on, numpy.uint8, offset=16).reshape(1080, 2400, 4).copy()
+    report("screen: copy whole frame", n, time.perf_counter() - t)
+    t = time.perf_counter()
+    for i in range(n):
+        watch.check(on)
+    report("screen: region check", n, time.perf_counter() - t)
+
+    server = FakeAdbServer(frame=on).start()
+    client = tweaker.AdbClient(port=server.port)
+
+    def channel():
+        sock = client.open_service(FAKE_SERIAL, "exec:sh")
+        return sock.sendall, sock.recv_into, sock.close
+    capture = tweaker.ScreenCapture(channel)
+    capture.capture()
+    t = time.perf_counter()
+    for i in range(min(n, 50)):
+        watch.check(capture.capture())
+    report("screen: raw capture + check", min(n, 50), time.perf_counter() - t)
+    capture.close()
+    server.stop()
+
+def bench_probe(args):
+    # getevent parsing at a high event rate, then the loopback probe per backend against the fake adb server
+    n = max(args.n, 1000) * 100
+    ts = time.time()
+    data = "".join([f"[{int(ts):8d}.{i % 1000000:06d}] 0003 {0x35 + i % 2:04x} {i:08x}\n" for i in range(n)]).encode()
+    chunks = [data[i:i + 65536] for i in range(0, len(data), 65536)]
+    seen = [0]
+
+    def on_event(ts, t, c, v):
+        seen[0] += 1
+    parser = tweaker.GeteventParser(on_event, 3, 0x35)
+    t = time.perf_counter()
+    for chunk in chunks:
+        parser.feed(chunk)
+    report(f"probe: parser, {seen[0]} matched", n, time.perf_counter() - t)
+    pattern = re.compile(r"\[\s*([\d.]+)\] (\w{4}) (\w{4}) (\w{8})")
+    matched = 0
+    t = time.perf_counter()
+    pending = ""
+    for chunk in chunks:
+        lines = (pending + chunk.decode()).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            m = pattern.match(line)
+            if m is not None and m.group(2) == "0003" and m.group(3) == "0035":
+                on_event(float(m.group(1)), 3, 0x35, int(m.group(4), 16))
+                matched += 1
+    report(f"probe: decode + regex, {matched} matched", n, time.perf_counter() - t)
+
+    server = FakeAdbServer().start()
+    result = tweaker.LatencyTracer()
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in args.backends.split(","):
+            config = bench_config(server.port, os.path.join(tmp, "profiles.json"), backend=backend)
+            config["trace"] = True
+            with contextlib.redirect_stdout(io.StringIO()):
+                adb = tweaker.Adb(config)
+            tweaker.LoopbackProbe(adb, min(args.n, 500), rate=200).run()
+            result.merge(adb.tracer, backend)
+    server.stop()
+    result.dump()
+
+def fake_adb_script(tmp):
+    # an executable adb stand-in that forwards to fake_adb.py
+    root = os.path.dirname(os.path.abspath(__file__))
+    fake = os.path.join(root, "fake_adb.py")
+    if os.name == "nt":
+        path = os.path.join(tmp, "adb.cmd")
+        with open(path, "w") as f:
+            f.write(f"@\"{sys.executable}\" \"{fake}\" %*\n")
+    else:
+        path = os.path.join(tmp, "adb")
+        with open(path, "w") as f:
+            f.write(f"#!/bin/sh\nexec \"{sys.executable}\" \"{fake}\" \"$@\"\n")
+        os.chmod(path, 0o755)
+    return path
+
+SYNTHETIC_KEYS = [0x31, 0x57, 0x51]
+
+def synthetic_input(conn, pointer, rate, count, key_every):
+    # mouse circling the player at rate Hz (0: unpaced), deflecting the pad stick,
+    # a key tap every key_every moves, then exit
+    start = time.perf_counter()
+    for i in range(count):
+        due = start + i / rate if rate > 0 else 0
+        while time.perf_counter() < due:
+            pass
+        now = time.perf_counter()
+        x = int(1200 + 400 * math.cos(i / 50))
+        y = int(540 + 400 * math.sin(i / 50))
+        if pointer is not None:
+            pointer.write(x, y, now)
+        else:
+            conn.send_bytes(tweaker.MSG.pack(tweaker.MSG_MOVE, 0, 0, x, y, now))
+        if i % key_every == 0:
+            vk = SYNTHETIC_KEYS[i // key_every % len(SYNTHETIC_KEYS)]
+            conn.send_bytes(tweaker.MSG.pack(tweaker.MSG_KEY_DOWN, 0, vk, 0, 0, now))
+            conn.send_bytes(tweaker.MSG.pack(tweaker.MSG_KEY_UP, 0, vk, 0, 0, now))
+    # let the last tick sample the final position
+    time.sleep(0.05)
+    conn.send_bytes(tweaker.MSG.pack(tweaker.MSG_EXIT, 0, 0, 0, 0, time.perf_counter()))
+
+class SyntheticInput:
+    def __init__(self, rate, count, key_every):
+        self.rate = rate
+        self.count = count
+        self.key_every = key_every
+
+    def __call__(self, conn, pointer):
+        synthetic_input(conn, pointer, self.rate, self.count, self.key_every)
+
+def count_commands(records, word_size=64):
+    # injected commands seen by the fake adb, discovery excluded
+    n = 0
+    for kind, data in records:
+        if kind == "bytes":
+            n += len(data) // tweaker.INPUT_EVENT_LAYOUTS[word_size].size
+            continue
+        for cmd in data.decode().split(";"):
+            if cmd.startswith("sendevent") or cmd.startswith("input"):
+                n += 1
+    return n
+
+def run_pipeline(client, backend, core, args, tmp, server):
+    config = bench_config(server.port, os.path.join(tmp, f"profiles-{client}.json"), client=client, backend=backend)
+    config["trace"] = True
+    config["tick_hz"] = args.tick_hz
+    log = os.path.join(tmp, f"adb-{client}-{backend}-{core}.log")
+    if client == "exe":
+        config["adb"]["path"] = fake_adb_script(tmp)
+        os.environ["FAKE_ADB_LOG"] = log
+    with contextlib.redirect_stdout(io.StringIO()):
+        adb = tweaker.Adb(config)
+        reactor = tweaker.Reactor(config, adb, tweaker.Mapper(config))
+        mark = len(server.records)
+        key_every = max(1, (args.rate or 1000) // max(1, args.key_rate))
+        t = time.perf_counter()
+        if core == "async":
+            router = tweaker.Router([reactor])
+            if args.replay:
+                asyncio.run(router.run(replay=args.replay, speed=args.speed))
+            else:
+                asyncio.run(router.run(SyntheticInput(args.rate, args.n, key_every)))
+        elif args.replay:
+            reactor.replay(args.replay, args.speed)
+        else:
+            reactor.loop(SyntheticInput(args.rate, args.n, key_every))
+        if args.replay:
+            events = sum([1 for r in tweaker.read_records(args.replay) if r[0] != tweaker.MSG_EXIT])
+        else:
+            events = args.n + 2 * len(range(0, args.n, key_every))
+        elapsed = time.perf_counter() - t
+        adb.scheduler.wait_idle()
+    if client == "exe":
+        records = [(kind, data) for ts, kind, data in read_log(log) if kind != "shell" or b"input" in data or b"sendevent" in data]
+    else:
+        records = []
+        for ts, serial, service, data in server.records[mark:]:
+            if service.startswith("exec:cat"):
+                records.append(("bytes", data))
+            elif service == "exec:sh" or (service.startswith("shell:") and len(data) == 0):
+                records.append(("line", data if service == "exec:sh" else service[6:].encode()))
+    commands = count_commands(records)
+    write = [h for (action, stage), h in adb.tracer.histograms.items() if stage == "write" and action == "stick_move"]
+    p50 = write[0].percentile(50) * 1000 if write else 0
+    p99 = write[0].percentile(99) * 1000 if write else 0
+    print(f"{client + '/' + backend + '/' + core:<22} {events:>8} {events / elapsed:>10.0f} {commands / events:>10.3f} {p50:>9.2f} {p99:>9.2f}")
+    if args.verbose:
+        adb.tracer.dump()
+
+def bench_pipeline(args):
+    server = FakeAdbServer().start()
+    print(f"{'client/backend/core':<22} {'events':>8} {'events/s':>10} {'cmd/event':>10} {'p50 ms':>9} {'p99 ms':>9}  (stick_move event -> write)")
+    with tempfile.TemporaryDirectory() as tmp:
+        for client in ["socket", "exe"]:
+            for backend in args.backends.split(","):
+                for core in args.cores.split(","):
+                    run_pipeline(client, backend, core, args, tmp, server)
+    server.stop()
+
+BENCHES = {
+    "client": bench_client,
+    "startup": bench_startup,
+    "dispatch": bench_dispatch,
+    "geometry": bench_geometry,
+    "stick": bench_stick,
+    "look": bench_look,
+    "timers": bench_timers,
+    "overload": bench_overload,
+    "screen": bench_screen,
+    "probe": bench_probe,
+    "pipeline": bench_pipeline,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("bench", nargs="*", help=f"any of: {', '.join(BENCHES.keys())}")
+    parser.add_argument("-n", type=int, default=1000)
+    parser.add_argument("--rate", type=int, default=1000, help="synthetic mouse events per second, 0 for as fast as possible")
+    parser.add_argument("--key-rate", type=int, default=10, help="synthetic key taps per second")
+    parser.add_argument("--tick-hz", type=int, default=120, help="reactor pointer sampling rate, 0 sends every move")
+    parser.add_argument("--backends", default="shell,binary,process")
+    parser.add_argument("--cores", default="sync,async", help="pipeline: thread based runtime, asyncio core or both")
+    parser.add_argument("--replay", help="pipeline: drive the backends with a recorded session instead of synthetic input")
+    parser.add_argument("--speed", type=float, default=0, help="pipeline: replay speed, 0 for as fast as possible")
+    parser.add_argument("--stall-ms", type=float, default=1000, help="overload: how long the device stops taking writes")
+    parser.add_argument("--jitter-ms", type=float, default=15, help="timers: p99 lateness budget")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+    for name in args.bench or BENCHES.keys():
+        BENCHES[name](args)
+    if len(failures) > 0:
+        sys.exit(1)
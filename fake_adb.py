@@ -0,0 +1,275 @@
+#region Fake ADB
+#
+# Stand-ins for adb, used to run the tweaker and bench.py offline:
+#   server speaking the smart-socket host protocol: "python fake_adb.py --port 5037"
+#   adb command line, recording to $FAKE_ADB_LOG:   "python fake_adb.py -s <serial> shell ..."
+#
+#endregion
+
+import os
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+FAKE_SERIAL = "127.0.0.1:16384"
+
+FAKE_GETEVENT = """add device 1: /dev/input/event0
+  name:     "qwerty2"
+  events:
+    KEY (0001): KEY_ESC               KEY_1                 KEY_2                 KEY_3
+  input props:
+    <none>
+add device 2: /dev/input/event4
+  name:     "MuMu Touch"
+  events:
+    KEY (0001): BTN_TOUCH
+    ABS (0003): ABS_MT_SLOT           : value 0, min 0, max 9, fuzz 0, flat 0, resolution 0
+                ABS_MT_TOUCH_MAJOR    : value 0, min 0, max 255, fuzz 0, flat 0, resolution 0
+                ABS_MT_POSITION_X     : value 0, min 0, max 1079, fuzz 0, flat 0, resolution 0
+                ABS_MT_POSITION_Y     : value 0, min 0, max 2399, fuzz 0, flat 0, resolution 0
+                ABS_MT_TRACKING_ID    : value 0, min 0, max 65535, fuzz 0, flat 0, resolution 0
+                ABS_MT_PRESSURE       : value 0, min 0, max 255, fuzz 0, flat 0, resolution 0
+  input props:
+    INPUT_PROP_DIRECT
+"""
+
+FAKE_SHELL = {
+    "getevent -pl": FAKE_GETEVENT,
+    "wm size": "Physical size: 1080x2400\n",
+    "getprop ro.product.cpu.abi": "x86_64\n",
+    "dumpsys input | grep -m1 SurfaceOrientation": "      SurfaceOrientation: 1\n",
+}
+
+# struct input_event of a 64 bit device
+FAKE_INPUT_EVENT = struct.Struct("<qqHHi")
+
+def sendevents(text):
+    # "sendevent <node> <type> <code> <value>" commands -> [(type, code, value)]
+    events = []
+    for cmd in text.replace("\n", ";").split(";"):
+        parts = cmd.split()
+        if len(parts) == 5 and parts[0] == "sendevent":
+            events.append((int(parts[2]), int(parts[3]), int(parts[4])))
+    return events
+
+def fake_shell(cmd, outputs=FAKE_SHELL):
+    return "".join([outputs.get(c.strip(), "") for c in cmd.split("&&")])
+
+def read_log(path):
+    # [(timestamp, kind, data)] written by the command line stand-in
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            ts, kind, data = line.split(" ")
+            records.append((float(ts), kind, bytes.fromhex(data.strip())))
+    return records
+
+class FakeAdbCli:
+    def __init__(self, log):
+        self.log = log
+
+    def record(self, kind, data):
+        if self.log is None:
+            return
+        with open(self.log, "a", encoding="utf-8") as f:
+            f.write(f"{time.perf_counter():.6f} {kind} {data.hex()}\n")
+
+    def run(self, args):
+        if args[:1] == ["-s"]:
+            args = args[2:]
+        cmd = args[0] if len(args) > 0 else ""
+        if cmd == "connect":
+            print(f"already connected to {args[1]}")
+        elif cmd == "devices":
+            print("List of devices attached")
+            print(f"{FAKE_SERIAL}\tdevice")
+        elif cmd == "shell" and len(args) > 1:
+            line = " ".join(args[1:])
+            self.record("shell", line.encode())
+            sys.stdout.write(fake_shell(line))
+        elif cmd == "shell":
+            for line in sys.stdin.buffer:
+                self.record("line", line.rstrip(b"\n"))
+        elif cmd == "exec-in":
+            while True:
+                data = sys.stdin.buffer.read1(65536)
+                if len(data) == 0:
+                    break
+                self.record("bytes", data)
+        else:
+            print(f"fake adb: unsupported command {cmd}", file=sys.stderr)
+            return 1
+        return 0
+
+class FakeAdbHandler(socketserver.BaseRequestHandler):
+    def __recv_exact(self, n):
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self.request.recv(n - len(buf))
+            if len(chunk) == 0:
+                return None
+            buf += chunk
+        return bytes(buf)
+
+    def __recv_request(self):
+        n = self.__recv_exact(4)
+        if n is None:
+            return None
+        return self.__recv_exact(int(n, 16)).decode()
+
+    def __okay(self, payload=None):
+        if payload is None:
+            self.request.sendall(b"OKAY")
+            return
+        data = payload.encode()
+        self.request.sendall(b"OKAY" + b"%04x" % len(data) + data)
+
+    def __fail(self, msg):
+        data = msg.encode()
+        self.request.sendall(b"FAIL" + b"%04x" % len(data) + data)
+
+    def handle(self):
+        server = self.server
+        serial = None
+        while True:
+            service = self.__recv_request()
+            if service is None:
+                return
+            server.record(serial, service, b"")
+            if service == "host:version":
+                return self.__okay("0029")
+            if service == "host:devices":
+                return self.__okay("".join([f"{s}\tdevice\n" for s in server.serials]))
+            if service.startswith("host:connect:"):
+                return self.__okay(f"already connected to {service[13:]}")
+            if service.startswith("host:transport:"):
+                serial = service[15:]
+                if serial not in server.serials:
+                    return self.__fail(f"device '{serial}' not found")
+                self.__okay()
+                continue
+            if serial is None:
+                return self.__fail(f"unknown host service {service}")
+            if service.startswith("exec:getevent"):
+                # every injected event, stamped on arrival like the kernel would
+                self.__okay()
+                server.listen(self.request)
+                try:
+                    while len(self.request.recv(65536)) > 0:
+                        pass
+                except OSError:
+                    pass
+                server.unlisten(self.request)
+                return
+            if service.startswith("shell:"):
+                server.echo(sendevents(service[6:]))
+                self.__okay()
+                self.request.sendall(server.shell(service[6:]).encode())
+                return
+            if service.startswith("exec:"):
+                self.__okay()
+                pending = b""
+                while True:
+                    data = self.request.recv(65536)
+                    if len(data) == 0:
+                        return
+                    server.record(serial, service, data)
+                    pending += data
+                    if service.startswith("exec:cat"):
+                        n = len(pending) - len(pending) % FAKE_INPUT_EVENT.size
+                        server.echo([e[2:] for e in FAKE_INPUT_EVENT.iter_unpack(pending[:n])])
+                        pending = pending[n:]
+                        continue
+                    if service != "exec:sh":
+                        continue
+                    while b"\n" in pending:
+                        line, pending = pending.split(b"\n", 1)
+                        line = line.decode().strip()
+                        server.echo(sendevents(line))
+                        # a shell answering screencap with the server's raw frame
+                        reply = server.exec_reply(line) if server.frame is not None else None
+                        if reply is not None:
+                            self.request.sendall(reply)
+            return self.__fail(f"unknown service {service}")
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, serials=None, shell=None, frame=None):
+        super().__init__(("127.0.0.1", port), FakeAdbHandler)
+        self.port = self.server_address[1]
+        self.serials = serials or [FAKE_SERIAL]
+        self.outputs = dict(FAKE_SHELL)
+        self.outputs.update(shell or {})
+        self.records = []
+        self.records_lock = threading.Lock()
+        # raw screencap output served to "screencap" on exec:sh, None leaves the shell silent
+        self.frame = frame
+        # sockets of "getevent -t" readers
+        self.listeners = []
+        self.thread = None
+
+    def record(self, serial, service, data):
+        with self.records_lock:
+            self.records.append((time.perf_counter(), serial, service, data))
+
+    def shell(self, cmd):
+        return fake_shell(cmd, self.outputs)
+
+    def listen(self, sock):
+        with self.records_lock:
+            self.listeners.append(sock)
+
+    def unlisten(self, sock):
+        with self.records_lock:
+            self.listeners.remove(sock)
+
+    def echo(self, events):
+        if len(events) == 0 or len(self.listeners) == 0:
+            return
+        ts = time.time()
+        stamp = f"[{int(ts):8d}.{int(ts % 1 * 1000000):06d}]"
+        data = "".join([f"{stamp} {t:04x} {c:04x} {v & 0xffffffff:08x}\n" for t, c, v in events]).encode()
+        with self.records_lock:
+            listeners = list(self.listeners)
+        for sock in listeners:
+            try:
+                sock.sendall(data)
+            except OSError:
+                pass
+
+    def exec_reply(self, line):
+        if line == "screencap":
+            return self.frame
+        if line == "screencap | wc -c":
+            return f"{len(self.frame)}\n".encode()
+        return None
+
+    def received(self, service):
+        with self.records_lock:
+            return b"".join([r[3] for r in self.records if r[2] == service])
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and not sys.argv[1].startswith("--"):
+        sys.exit(FakeAdbCli(os.environ.get("FAKE_ADB_LOG")).run(sys.argv[1:]))
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=5037)
+    args = parser.parse_args()
+    server = FakeAdbServer(args.port)
+    print(f"Fake adb server listening on 127.0.0.1:{server.port}")
+    server.serve_forever()
@@ -5,39 +5,23 @@
 #endregion
 
 #region Init
-import importlib
-import pip
-import ast
 import os
+import sys
 import time
 import re
 import math
-
-os.system("pip install --upgrade pip --quiet")
-
-current_file_path = os.path.abspath(__file__)
-with open(current_file_path, "r", encoding="utf-8") as f:
-    current_file_str = f.read()
-
-def pip_install(p):
-    try:
-        importlib.import_module(p)
-    except ImportError:
-        os.system(f"pip install {p}")
-        # pip.main(["install", p])
-
-for node in ast.walk(ast.parse(current_file_str)):
-    if isinstance(node, ast.Import):
-        for alias in node.names:
-            pip_install(alias.name)
-    elif isinstance(node, ast.ImportFrom):
-        pip_install(node.module)
-
 import json
-import jsons
 import traceback
 
+# third-party packages, installed by "python tweaker.py --bootstrap"
+DEPENDENCIES = ["pynput", "pygetwindow", "jsons"]
+
+def bootstrap():
+    subprocess.call([sys.executable, "-m", "pip", "install", "--upgrade", "pip", "--quiet"])
+    subprocess.call([sys.executable, "-m", "pip", "install", "--upgrade"] + DEPENDENCIES)
+
 def debug_obj(obj):
+    import jsons
     j = jsons.dump(obj, indent=4)
     print(j)
 
@@ -46,11 +30,86 @@ def debug_traceback(e):
     [print(i) for i in tb]
 #endregion
 
+#region Trace
+class Histogram:
+    # log-spaced buckets from 10us, each ~12% wider than the last
+    BASE = 0.00001
+    GROWTH = 1.12
+    SIZE = 128
+
+    def __init__(self):
+        self.counts = [0] * Histogram.SIZE
+        self.n = 0
+
+    def add(self, seconds):
+        i = 0
+        if seconds > Histogram.BASE:
+            i = min(int(math.log(seconds / Histogram.BASE) / math.log(Histogram.GROWTH)) + 1, Histogram.SIZE - 1)
+        self.counts[i] += 1
+        self.n += 1
+
+    def percentile(self, p):
+        if self.n == 0:
+            return 0
+        target = self.n * p / 100
+        seen = 0
+        for i in range(Histogram.SIZE):
+            seen += self.counts[i]
+            if seen >= target:
+                return Histogram.BASE * Histogram.GROWTH ** i
+        return Histogram.BASE * Histogram.GROWTH ** (Histogram.SIZE - 1)
+
+class LatencyTracer:
+    # time since the desktop stamped the event, at each stage boundary,
+    # the loopback probe adds "device" (delivered to the input node) and "echo" (read back on the host)
+    STAGES = ["ipc", "dispatch", "enqueue", "dequeue", "write", "device", "echo"]
+
+    def __init__(self):
+        self.histograms = {}
+        # action -> (lost, sent), from the loopback probe
+        self.lost = {}
+
+    def record(self, action, stage, origin):
+        self.add(action, stage, time.perf_counter() - origin)
+
+    def add(self, action, stage, seconds):
+        h = self.histograms.get((action, stage))
+        if h is None:
+            h = self.histograms.setdefault((action, stage), Histogram())
+        h.add(seconds)
+
+    def merge(self, other, suffix):
+        # another tracer's rows as "<action>/<suffix>", to compare runs in one report
+        for (action, stage), h in other.histograms.items():
+            self.histograms[(f"{action}/{suffix}", stage)] = h
+        for action, lost in other.lost.items():
+            self.lost[f"{action}/{suffix}"] = lost
+
+    def report(self):
+        lines = [f"{'action':<20} {'stage':<10} {'n':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"]
+        order = {stage: i for i, stage in enumerate(LatencyTracer.STAGES)}
+        for (action, stage) in sorted(self.histograms.keys(), key=lambda k: (str(k[0]), order.get(k[1], len(order)))):
+            h = self.histograms[(action, stage)]
+            lines.append(f"{action:<20} {stage:<10} {h.n:>8} {h.percentile(50) * 1000:>9.2f} {h.percentile(95) * 1000:>9.2f} {h.percentile(99) * 1000:>9.2f}")
+        for action, (lost, sent) in sorted(self.lost.items()):
+            lines.append(f"{action:<20} {'lost':<10} {lost:>8} of {sent} ({lost / max(sent, 1) * 100:.1f}%)")
+        return "\n".join(lines)
+
+    def dump(self):
+        print(self.report())
+#endregion
+
 #region Config
-def __System_Config__():
+def __System_Config_Path__(path=None):
+    if path is None:
+        path = f"{os.path.dirname(os.path.abspath(__file__))}/configs.json"
+    return path
+
+def __System_Config__(path=None):
     root_path = os.path.dirname(os.path.abspath(__file__))
     buildin_adb_path = f"{root_path}/platform-tools/adb.exe"
-    with open(f"{root_path}/configs.json", "r", encoding="utf-8") as f:
+    path = __System_Config_Path__(path)
+    with open(path, "r", encoding="utf-8") as f:
         configs = json.load(f)
     if len(configs) == 0:
         print("No environment found.")
@@ -64,16 +123,120 @@ def __System_Config__():
         index = int(input("Select an environment: "))
         config = configs[index]
     return config
+
+def __System_Configs__(path=None, names="all"):
+    # several environments for one process, "all" or comma separated names
+    path = __System_Config_Path__(path)
+    with open(path, "r", encoding="utf-8") as f:
+        configs = json.load(f)
+    if names != "all":
+        wanted = names.split(",")
+        missing = [n for n in wanted if n not in [c["name"] for c in configs]]
+        if len(missing) > 0:
+            print(f"Unknown environment: {', '.join(missing)}")
+            exit()
+        configs = [c for c in configs if c["name"] in wanted]
+    if len(configs) == 0:
+        print("No environment found.")
+        exit()
+    return configs
+
+class ConfigWatcher:
+    # one stat per interval, the file is only parsed when its mtime moves
+    def __init__(self, path, on_change, interval=1.0):
+        self.path = __System_Config_Path__(path)
+        self.on_change = on_change
+        self.interval = interval
+
+    def start(self):
+        threading.Thread(target=self.__watch, daemon=True).start()
+        return self
+
+    def __mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def __watch(self):
+        last = self.__mtime()
+        while True:
+            time.sleep(self.interval)
+            mtime = self.__mtime()
+            if mtime == last:
+                continue
+            last = mtime
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    configs = json.load(f)
+            except (OSError, ValueError) as e:
+                # half-saved files land here too, the next save is picked up
+                print(f"Rejected configs.json edit: {e}")
+                continue
+            try:
+                self.on_change(configs)
+            except Exception as e:
+                print(f"Error: {e}")
+                debug_traceback(e)
 #endregion
 
 #region Mapper
+class Action:
+    __slots__ = ("key", "execute", "fn", "args", "condition")
+
+    def __init__(self, key, execute, fn, args):
+        self.key = key
+        self.execute = execute
+        self.fn = fn
+        self.args = args
+        # ("if" or "when", screen region, timeout), tested by the reactor before the action runs
+        self.condition = None
+
+    def __call__(self, origin=None):
+        self.execute(self.fn, *self.args, origin=origin)
+
+    def release(self, origin=None):
+        pass
+
+class RepeatAction(Action):
+    # fires on press, then every period until the key is released
+    __slots__ = ("every", "period", "timer")
+
+    def __init__(self, key, execute, fn, args, every, period):
+        super().__init__(key, execute, fn, args)
+        self.every = every
+        self.period = period
+        self.timer = None
+
+    def __call__(self, origin=None):
+        self.execute(self.fn, *self.args, origin=origin)
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = self.every(self.period, self.fn, *self.args)
+
+    def release(self, origin=None):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+class HoldAction(Action):
+    # a finger down for as long as the key is, args are (touch key, x, y) of touch_start
+    __slots__ = ()
+
+    def release(self, origin=None):
+        self.execute("touch_end", self.args[0], origin=origin)
+
 class Mapper:
     def __init__(self, config):
         self.__pad = None
         self.__pad_stop = None
         self.keys = config["keys"]
         for k, v in self.keys.items():
-            self.keys[k] = [Mapper.__float(e) for e in v.split()]
+            self.keys[k] = Mapper.__parse(v)
+        # (vk << 3 | modifiers) -> Action, filled by compile()
+        self.table = [None] * (256 << 3)
+        # key -> (vk, modifiers, Action, Joystick or None) behind the table
+        self.compiled = {}
 
     def __float(s):
         try:
@@ -82,6 +245,10 @@ class Mapper:
         except ValueError:
             return s
 
+    def __parse(v):
+        # "click 0.2 0.08; wait 50; click 0.25 0.08 repeat 5" -> tokens, ";" kept as a separator
+        return [Mapper.__float(e) for e in v.replace(";", " ; ").split()]
+
     def map(self, k):
         if k in self.keys:
             return self.keys[k]
@@ -89,11 +256,15 @@ class Mapper:
             return None
 
     def add(self, k, v):
-        self.keys[k] = [Mapper.__float(e) for e in v.split()]
+        self.keys[k] = Mapper.__parse(v)
+        self.__pad = None
+        self.__pad_stop = None
 
     def remove(self, k):
         if k in self.keys:
             del self.keys[k]
+        self.__pad = None
+        self.__pad_stop = None
 
     def pad(self):
         if self.__pad is not None:
@@ -115,47 +286,672 @@ class Mapper:
             return k
         return None
 
+    def __parse_key(k):
+        # "CSAi" -> (ctrl | shift | alt, "i"), unprefixed keys match any modifiers
+        mods = 0
+        while len(k) > 1 and k[0] in MOD_PREFIXES:
+            mods |= MOD_PREFIXES[k[0]]
+            k = k[1:]
+        return (mods if mods != 0 else None), k
+
+    def __condition(v):
+        # "<action> if <region>", "<action> when <region> [<timeout ms>]" -> (action tokens, condition),
+        # condition is None without one and False when malformed
+        for mode in ["if", "when"]:
+            if mode not in v:
+                continue
+            i = v.index(mode)
+            rest = v[i + 1:]
+            if i == 0 or len(rest) == 0 or not isinstance(rest[0], str) or len(rest) > (2 if mode == "when" else 1):
+                return v, False
+            timeout = 2.0
+            if len(rest) == 2:
+                if not isinstance(rest[1], float):
+                    return v, False
+                timeout = rest[1] / 1000
+            return v[:i], (mode, rest[0], timeout)
+        return v, None
+
+    def __action(self, adb, k, v):
+        if "repeat" in v:
+            return self.__repeat(adb, k, v)
+        if ";" in v:
+            return self.__combo(adb, k, v)
+        act_type = v[0]
+        args = v[1:]
+        try:
+            if act_type == "click":
+                return Action(k, adb.execute, "tap", adb.point(args[0], args[1]))
+            elif act_type == "swipe":
+                return Action(k, adb.execute, "drag", adb.point(args[0], args[1]) + adb.point(args[2], args[3]))
+            elif act_type == "swipe_direction":
+                return Action(k, adb.execute, "drag", adb.point_diff(args[0], args[1], args[2], args[3]))
+            elif act_type == "swipe_area":
+                return Action(k, adb.execute, "look_toggle", (k, args[0], args[1]))
+            elif act_type == "press":
+                return Action(k, adb.execute, "press", adb.point(args[0], args[1]) + (args[2] / 1000,))
+            elif act_type == "hold":
+                # raw events whatever the gesture mode, input has no way to keep a finger down
+                return HoldAction(k, adb.execute, "touch_start", (k,) + adb.abs_coord(args[0], args[1]))
+            elif act_type == "pad":
+                return Action(k, adb.execute, "stick_toggle", (k,))
+        except (IndexError, TypeError):
+            print(f"Invalid binding: {k}: {' '.join([str(e) for e in v])}")
+            return None
+        print(f"Unknown action: {act_type}")
+        return None
+
+    def __repeat(self, adb, k, v):
+        # "<action> repeat <hz>": again and again while the key is held
+        i = v.index("repeat")
+        rate = v[i + 1] if i + 2 == len(v) else None
+        if not isinstance(rate, float) or rate <= 0 or i == 0:
+            print(f"Invalid binding: {k}: {' '.join([str(e) for e in v])}")
+            return None
+        action = self.__action(adb, k, v[:i])
+        if action is None:
+            return None
+        if isinstance(action, HoldAction):
+            print(f"Invalid binding: {k}: hold can't repeat")
+            return None
+        return RepeatAction(k, adb.execute, action.fn, action.args, adb.execute_every, 1 / rate)
+
+    def __combo(self, adb, k, v):
+        # "<action>; wait <ms>; <action>": chained steps, waits add up
+        steps = []
+        delay = 0.0
+        step = []
+        for e in v + [";"]:
+            if e != ";":
+                step.append(e)
+                continue
+            if len(step) == 0:
+                continue
+            if step[0] == "wait":
+                if len(step) != 2 or not isinstance(step[1], float):
+                    print(f"Invalid binding: {k}: {' '.join([str(e) for e in v])}")
+                    return None
+                delay += step[1] / 1000
+            else:
+                action = self.__action(adb, k, step)
+                if action is None:
+                    return None
+                if isinstance(action, HoldAction):
+                    # nothing would lift the finger
+                    print(f"Invalid binding: {k}: hold can't be a combo step")
+                    return None
+                steps.append((delay, action.fn, action.args))
+            step = []
+        if len(steps) == 0:
+            print(f"Invalid binding: {k}: {' '.join([str(e) for e in v])}")
+            return None
+        return Action(k, adb.execute, "combo", (tuple(steps),))
+
+    def __compile_key(self, adb, k, v):
+        if len(v) == 0:
+            print(f"Invalid binding: {k}")
+            return None
+        mods, name = Mapper.__parse_key(k)
+        if name not in self.vks:
+            print(f"Unknown key: {k}")
+            return None
+        tokens, condition = Mapper.__condition(v)
+        if condition is False:
+            print(f"Invalid binding: {k}: {' '.join([str(e) for e in v])}")
+            return None
+        if condition is not None and (adb.screen is None or condition[1] not in adb.screen.regions):
+            print(f"Unknown screen region: {k}: {condition[1]}")
+            return None
+        action = self.__action(adb, k, tokens)
+        if action is None:
+            return None
+        if condition is not None and condition[0] == "when" and isinstance(action, HoldAction):
+            # the finger would go down whenever the region shows up, possibly after the key is released
+            print(f"Invalid binding: {k}: hold can't wait for a screen region")
+            return None
+        action.condition = condition
+        stick = None
+        if v[0] == "pad":
+            try:
+                stick = adb.joystick(k, float(v[1]), float(v[2]))
+            except (IndexError, TypeError, ValueError):
+                print(f"Invalid binding: {k}: {' '.join([str(e) for e in v])}")
+                return None
+        return (self.vks[name], mods, action, stick)
+
+    def __swap(self, adb, compiled, vks):
+        # rebuilds the rows of the touched keys in a copy, the input path sees the old table or the new one
+        table = list(self.table)
+        rows = {vk: [] for vk in vks}
+        for vk, mods, action, stick in compiled.values():
+            if vk in rows:
+                rows[vk].append((mods, action))
+        for vk, row in rows.items():
+            # exact modifiers win over an unprefixed key
+            wildcard = None
+            for mods, action in row:
+                if mods is None:
+                    wildcard = action
+            for m in range(8):
+                table[vk << 3 | m] = wildcard
+            for mods, action in row:
+                if mods is not None:
+                    table[vk << 3 | mods] = action
+        for k, entry in self.compiled.items():
+            if entry[3] is not None and compiled.get(k) is not entry:
+                adb.attach_stick(k, None)
+        for k, entry in compiled.items():
+            if entry[3] is not None and self.compiled.get(k) is not entry:
+                adb.attach_stick(k, entry[3])
+        self.compiled = compiled
+        self.table = table
+        self.__pad = None
+        self.__pad_stop = None
+
+    def compile(self, adb):
+        self.vks = {name: vk for vk, name in enumerate(KEY_NAMES) if name is not None}
+        compiled = {}
+        for k, v in self.keys.items():
+            entry = self.__compile_key(adb, k, v)
+            if entry is not None:
+                compiled[k] = entry
+        self.__swap(adb, compiled, set([e[0] for e in compiled.values()]))
+
+    def reload(self, adb, keys):
+        # recompiles only the bindings that differ from the live ones, one bad binding rejects the whole edit
+        try:
+            parsed = {k: Mapper.__parse(v) for k, v in keys.items()}
+        except AttributeError:
+            print("Rejected keys: bindings must be strings, keeping the live keymap")
+            return False
+        changed = [k for k, v in parsed.items() if self.keys.get(k) != v]
+        removed = [k for k in self.keys if k not in parsed]
+        if len(changed) == 0 and len(removed) == 0:
+            return False
+        compiled = dict(self.compiled)
+        vks = set([compiled[k][0] for k in changed + removed if k in compiled])
+        for k in removed:
+            compiled.pop(k, None)
+        for k in changed:
+            entry = self.__compile_key(adb, k, parsed[k])
+            if entry is None:
+                print(f"Rejected binding {k}, keeping the live keymap")
+                return False
+            compiled[k] = entry
+            vks.add(entry[0])
+        self.keys = parsed
+        self.__swap(adb, compiled, vks)
+        print(f"Keymap reloaded: {len(changed)} changed, {len(removed)} removed")
+        return True
+
 #endregion
 
 #region ADB
 import threading
-import queue
 
-class MultiTouch:
-    def __init__(self):
-        self.mts = [{
-            "slot": i,
-            "occupy": False,
-            "id": 0,
-            "key": 0
-        } for i in range(8)]
-
-    def __key_to_id(key):
-        return ord(key) - ord("0")
-
-    def request_slot(self, key):
-        for i in range(8):
-            if not self.mts[i]["occupy"]:
-                self.mts[i]["occupy"] = True
-                self.mts[i]["id"] = MultiTouch.__key_to_id(key)
-                self.mts[i]["key"] = key
-                return self.mts[i]
-        return None
+class TouchEngine:
+    def __init__(self, slot_count, max_tracking_id, send):
+        self.slot_count = slot_count
+        self.max_tracking_id = max_tracking_id
+        self.send = send
+        self.keys = [None] * slot_count
+        self.xs = [0] * slot_count
+        self.ys = [0] * slot_count
+        self.slot_of = {}
+        self.free = list(range(slot_count - 1, -1, -1))
+        self.next_id = 1
+        # events of the frame being built, committed with one SYN_REPORT
+        self.pending = []
+        self.staged = set()
+        # slot -> [index of X, index of Y] in pending, a later move in the frame overwrites them
+        self.moved = {}
+        # slots whose touch-down is in pending
+        self.landed = set()
+        self.selected = -1
+        # committed frames, sent once the lock is released so a slow send never holds up the other lanes
+        self.outbox = []
+        # set when several workers send, frames may then reach the device in any order and each selects its slot
+        self.parallel = False
+        self.lock = threading.Lock()
+
+    def __select(self, slot):
+        if self.selected != slot:
+            self.pending.append((EV_ABS, ABS_MT_SLOT, slot))
+            self.selected = slot
+        self.staged.add(slot)
+
+    def __commit(self):
+        if len(self.pending) == 0:
+            return
+        self.pending.append((EV_SYN, SYN_REPORT, 0))
+        self.outbox.append(self.pending)
+        self.pending = []
+        self.staged.clear()
+        self.moved.clear()
+        self.landed.clear()
+        if self.parallel:
+            self.selected = -1
+
+    def __send(self):
+        with self.lock:
+            frames = self.outbox
+            self.outbox = []
+        for events in frames:
+            self.send(events)
+
+    def slot(self, key):
+        return self.slot_of.get(key, -1)
+
+    def active(self):
+        return len(self.slot_of)
+
+    def down(self, key, x, y):
+        with self.lock:
+            slot = self.__down(key, x, y)
+        self.__send()
+        return slot
+
+    def __down(self, key, x, y):
+        if key in self.slot_of:
+            slot = self.slot_of[key]
+        else:
+            if len(self.free) == 0:
+                return -1
+            # the slot freed longest ago when frames race, its lift is surely out before this press
+            slot = self.free.pop(0) if self.parallel else self.free.pop()
+            if slot in self.staged:
+                # a lift and a press on one slot need separate frames
+                self.__commit()
+            self.slot_of[key] = slot
+            self.keys[slot] = key
+            self.__select(slot)
+            self.pending.append((EV_ABS, ABS_MT_TRACKING_ID, self.next_id))
+            self.next_id = self.next_id % self.max_tracking_id + 1
+            self.xs[slot] = -1
+            self.ys[slot] = -1
+            self.__move(slot, x, y)
+            self.landed.add(slot)
+            return slot
+        self.__move(slot, x, y)
+        return slot
+
+    def __move(self, slot, x, y):
+        if self.xs[slot] == x and self.ys[slot] == y:
+            return
+        if slot in self.landed:
+            # the finger lands where it went down, a move in the same report would replace that point
+            self.__commit()
+        at = self.moved.setdefault(slot, [-1, -1])
+        if self.xs[slot] != x:
+            self.__set(slot, at, 0, ABS_MT_POSITION_X, x)
+            self.xs[slot] = x
+        if self.ys[slot] != y:
+            self.__set(slot, at, 1, ABS_MT_POSITION_Y, y)
+            self.ys[slot] = y
+
+    def __set(self, slot, at, axis, code, value):
+        if at[axis] >= 0:
+            self.pending[at[axis]] = (EV_ABS, code, value)
+            return
+        self.__select(slot)
+        at[axis] = len(self.pending)
+        self.pending.append((EV_ABS, code, value))
+
+    def move(self, key, x, y):
+        with self.lock:
+            slot = self.slot_of.get(key, -1)
+            if slot >= 0:
+                self.__move(slot, x, y)
+            return slot
+
+    def up(self, key):
+        with self.lock:
+            slot = self.__up(key)
+        self.__send()
+        return slot
+
+    def __up(self, key):
+        slot = self.slot_of.pop(key, -1)
+        if slot < 0:
+            return -1
+        if slot in self.staged:
+            # a press and a lift on one slot need separate frames
+            self.__commit()
+        self.__select(slot)
+        self.pending.append((EV_ABS, ABS_MT_TRACKING_ID, -1))
+        self.keys[slot] = None
+        self.free.append(slot)
+        return slot
+
+    def commit(self):
+        with self.lock:
+            self.__commit()
+        self.__send()
+
+#region ADB Stream
+import asyncio
+import subprocess
+
+class AdbStream:
+    def __init__(self, cmd, retry=3):
+        self.cmd = cmd
+        self.retry = retry
+        self.process = None
+        self.buffer = []
+        self.lock = threading.Lock()
+        # set by attach, flush then hands the buffer to an asyncio transport and never blocks
+        self.loop = None
+        self.writer = None
+        self.opening = None
+
+    def open(self):
+        self.process = subprocess.Popen(
+            self.cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL)
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def send(self, data):
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+
+    async def open_async(self):
+        process = await asyncio.create_subprocess_exec(
+            *self.cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL)
+        return None, process.stdin
+
+    def attach(self, loop):
+        self.close()
+        self.loop = loop
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=1)
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            self.process.kill()
+        self.process = None
+
+    def write(self, data):
+        with self.lock:
+            self.buffer.append(data)
+
+    def flush(self):
+        if self.loop is not None:
+            return self.__flush_async()
+        with self.lock:
+            if len(self.buffer) == 0:
+                return True
+            data = b"".join(self.buffer)
+            for i in range(self.retry):
+                try:
+                    if not self.alive():
+                        self.open()
+                    self.send(data)
+                    self.buffer.clear()
+                    return True
+                except (OSError, ValueError):
+                    print(f"Stream disconnected, reconnecting... ({i + 1}/{self.retry})")
+                    self.close()
+            # keep the buffer, it is replayed on the next flush
+            return False
 
-    def release_slot(self, key):
-        for i in range(8):
-            if self.mts[i]["key"] == key:
-                self.mts[i]["occupy"] = False
-                return
+    def __flush_async(self):
+        if len(self.buffer) == 0:
+            return True
+        if self.writer is None or self.writer.is_closing():
+            self.writer = None
+            if self.opening is None:
+                self.opening = self.loop.create_task(self.__open_async())
+            return False
+        self.writer.write(b"".join(self.buffer))
+        self.buffer.clear()
+        return True
 
-    def get_slot(self, key):
-        for i in range(8):
-            if self.mts[i]["occupy"] == True and self.mts[i]["key"] == key:
-                return self.mts[i]
-        return None
+    async def __open_async(self):
+        for i in range(self.retry):
+            try:
+                reader, self.writer = await self.open_async()
+                if reader is not None:
+                    self.loop.create_task(AdbStream.__discard(reader))
+                break
+            except (OSError, AdbError):
+                print(f"Stream disconnected, reconnecting... ({i + 1}/{self.retry})")
+        self.opening = None
+        if self.writer is not None:
+            self.__flush_async()
+
+    async def __discard(reader):
+        # whatever the service prints, so the device side never blocks
+        try:
+            while len(await reader.read(65536)) > 0:
+                pass
+        except OSError:
+            pass
+
+    def backlog(self):
+        if self.writer is None:
+            return sum([len(b) for b in self.buffer])
+        return self.writer.transport.get_write_buffer_size()
+
+    async def drain(self):
+        if self.writer is None:
+            return
+        try:
+            await self.writer.drain()
+        except OSError:
+            self.writer = None
 
-    def get_active_slot(self):
-        return [mt for mt in self.mts if mt["occupy"]]
+class AdbShell:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, cmd):
+        self.stream.write((cmd + "\n").encode())
+
+    def flush(self):
+        return self.stream.flush()
+
+    def close(self):
+        self.stream.close()
+#endregion
+
+#region ADB Client
+import socket
+
+class AdbError(Exception):
+    pass
+
+class AdbClient:
+    def __init__(self, host="127.0.0.1", port=5037, timeout=5):
+        self.address = (host, port)
+        self.timeout = timeout
+        self.streams = {}
+
+    def __recv_exact(sock, n):
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = sock.recv(n - len(buf))
+            if len(chunk) == 0:
+                raise AdbError("connection closed by adb server")
+            buf += chunk
+        return bytes(buf)
+
+    def __recv_block(sock):
+        n = int(AdbClient.__recv_exact(sock, 4), 16)
+        return AdbClient.__recv_exact(sock, n).decode("utf-8", "replace")
+
+    def __recv_all(sock):
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if len(chunk) == 0:
+                break
+            chunks.append(chunk)
+        return b"".join(chunks).decode("utf-8", "replace")
+
+    def __open(self):
+        sock = socket.create_connection(self.address, timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def __request(self, sock, service):
+        payload = service.encode()
+        sock.sendall(b"%04x" % len(payload) + payload)
+        status = AdbClient.__recv_exact(sock, 4)
+        if status == b"FAIL":
+            raise AdbError(f"{service}: {AdbClient.__recv_block(sock)}")
+        if status != b"OKAY":
+            raise AdbError(f"{service}: unexpected status {status!r}")
+
+    def host(self, service):
+        with self.__open() as sock:
+            self.__request(sock, service)
+            return AdbClient.__recv_block(sock)
+
+    def version(self):
+        return int(self.host("host:version"), 16)
+
+    def devices(self):
+        return [d.split() for d in self.host("host:devices").split("\n") if len(d) > 0]
+
+    def connect(self, ip_port):
+        return self.host(f"host:connect:{ip_port}")
+
+    def open_service(self, serial, service):
+        sock = self.__open()
+        try:
+            self.__request(sock, f"host:transport:{serial}")
+            self.__request(sock, service)
+        except Exception:
+            sock.close()
+            raise
+        sock.settimeout(None)
+        return sock
+
+    async def open_service_async(self, serial, service):
+        reader, writer = await asyncio.open_connection(*self.address)
+        try:
+            for request in [f"host:transport:{serial}", service]:
+                payload = request.encode()
+                writer.write(b"%04x" % len(payload) + payload)
+                status = await reader.readexactly(4)
+                if status == b"FAIL":
+                    n = int(await reader.readexactly(4), 16)
+                    raise AdbError(f"{request}: {(await reader.readexactly(n)).decode('utf-8', 'replace')}")
+                if status != b"OKAY":
+                    raise AdbError(f"{request}: unexpected status {status!r}")
+        except (OSError, asyncio.IncompleteReadError) as e:
+            writer.close()
+            raise AdbError(f"{service}: {e}")
+        except AdbError:
+            writer.close()
+            raise
+        return reader, writer
+
+    def shell(self, serial, cmd):
+        with self.open_service(serial, f"shell:{cmd}") as sock:
+            return AdbClient.__recv_all(sock)
+
+    def stream(self, serial, service):
+        key = (serial, service)
+        if key not in self.streams:
+            self.streams[key] = AdbSocketStream(self, serial, service)
+        return self.streams[key]
+
+    def close(self):
+        for s in self.streams.values():
+            s.close()
+        self.streams.clear()
+
+class AdbSocketStream(AdbStream):
+    def __init__(self, client, serial, service, retry=3):
+        super().__init__(None, retry)
+        self.client = client
+        self.serial = serial
+        self.service = service
+        self.sock = None
+
+    def open(self):
+        self.sock = self.client.open_service(self.serial, self.service)
+
+    async def open_async(self):
+        return await self.client.open_service_async(self.serial, self.service)
+
+    def alive(self):
+        return self.sock is not None
+
+    def __drain(self):
+        # discard whatever the service printed so the device side never blocks
+        self.sock.setblocking(False)
+        try:
+            while True:
+                if len(self.sock.recv(65536)) == 0:
+                    self.close()
+                    return
+        except (BlockingIOError, InterruptedError):
+            self.sock.setblocking(True)
+
+    def send(self, data):
+        self.sock.sendall(data)
+        self.__drain()
+
+    def close(self):
+        AdbStream.close(self)
+        if self.sock is None:
+            return
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        self.sock = None
+#endregion
+
+#region Device Profile
+class DeviceProfiles:
+    def __init__(self, path):
+        self.path = path
+        self.profiles = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.profiles = json.load(f)
+            except (OSError, ValueError):
+                print(f"Ignoring unreadable profile cache: {path}")
+
+    def __save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.profiles, f, indent=4)
+        os.replace(tmp, self.path)
+
+    def get(self, serial):
+        return self.profiles.get(serial)
+
+    def put(self, serial, profile):
+        self.profiles[serial] = profile
+        self.__save()
+
+    def invalidate(self, serial=None):
+        if serial is None:
+            self.profiles.clear()
+        elif serial in self.profiles:
+            del self.profiles[serial]
+        else:
+            return
+        self.__save()
+#endregion
 
 #region ADB Constants
 EV_SYN = 0   # 0: report
@@ -171,47 +967,968 @@ ABS_MT_PRESSURE = 58
 SYN_REPORT = 0
 #endregion
 
+#region Input Event
+import struct
+
+# struct input_event { struct timeval time; __u16 type; __u16 code; __s32 value; }
+INPUT_EVENT_LAYOUTS = {
+    64: struct.Struct("<qqHHi"),
+    32: struct.Struct("<iiHHi"),
+}
+
+class SendeventWriter:
+    def __init__(self, send, event):
+        self.send = send
+        self.event = event
+
+    def frame(self, events):
+        self.send(";".join([f"sendevent {self.event} {t} {c} {v}" for t, c, v in events]))
+
+class BinaryEventWriter:
+    def __init__(self, sink, word_size=64):
+        self.sink = sink
+        self.layout = INPUT_EVENT_LAYOUTS[word_size]
+
+    def pack(self, events):
+        size = self.layout.size
+        buf = bytearray(size * len(events))
+        for i, (t, c, v) in enumerate(events):
+            # the kernel stamps injected events itself, time is left zero
+            self.layout.pack_into(buf, i * size, 0, 0, t, c, v)
+        return bytes(buf)
+
+    def frame(self, events):
+        self.sink.write(self.pack(events))
+#endregion
+
+#region Joystick
+class Joystick:
+    # deflection (1 = full reach) -> a finger held on the on-screen stick,
+    # quantized to a grid so the device only hears about cell changes
+    def __init__(self, to_device, x, y, rx, ry, dead_zone=0.15, curve=1.0, grid=8, hysteresis=0.25):
+        self.to_device = to_device
+        self.x = x
+        self.y = y
+        self.rx = rx
+        self.ry = ry
+        self.dead_zone = min(dead_zone, 0.99)
+        self.curve = curve
+        self.grid = grid
+        # in cells, how far past its edge the pointer must go before the cell changes, hand jitter stays put
+        self.hysteresis = hysteresis
+        self.cell = None
+        self.enabled = True
+
+    def cell_of(self, dx, dy):
+        m = math.hypot(dx, dy)
+        if not self.enabled or m <= self.dead_zone:
+            return None
+        # rescaled past the dead zone, then shaped by the response curve
+        k = min(1.0, (m - self.dead_zone) / (1 - self.dead_zone)) ** self.curve * self.grid / m
+        cx = dx * k
+        cy = dy * k
+        last = self.cell
+        if last is not None and abs(cx - last[0]) <= 0.5 + self.hysteresis and abs(cy - last[1]) <= 0.5 + self.hysteresis:
+            return last
+        cell = (round(cx), round(cy))
+        # back at the center lifts the finger
+        return cell if cell != (0, 0) else None
+
+    def update(self, dx, dy):
+        # (fn, args) to send, None while the cell is unchanged
+        cell = self.cell_of(dx, dy)
+        if cell == self.cell:
+            return None
+        last, self.cell = self.cell, cell
+        if cell is None:
+            return ("touch_end", ())
+        pos = self.to_device(self.x + cell[0] * self.rx / self.grid, self.y + cell[1] * self.ry / self.grid)
+        return ("touch_start" if last is None else "touch_move", pos)
+
+class MouseLook:
+    # relative pointer motion as one finger dragged from an anchor, lifted and put back on the anchor
+    # when it reaches the edge of the area so the view keeps turning;
+    # fed the running total of the motion, so a later total stands in for an earlier one without losing any
+    MAX_RECENTERS = 16
+
+    def __init__(self, to_device, x, y, rx, ry):
+        self.to_device = to_device
+        self.x = x
+        self.y = y
+        self.rx = rx
+        self.ry = ry
+        self.total_x = 0.0
+        self.total_y = 0.0
+        # finger offset from the anchor, 1 is the edge of the area
+        self.ox = 0.0
+        self.oy = 0.0
+        self.down = False
+
+    def __pos(self):
+        return self.to_device(self.x + self.ox * self.rx, self.y + self.oy * self.ry)
+
+    def update(self, total_x, total_y):
+        # -> [(fn, args)] to send, in order
+        dx = (total_x - self.total_x) / self.rx
+        dy = (total_y - self.total_y) / self.ry
+        self.total_x = total_x
+        self.total_y = total_y
+        steps = []
+        if not self.down:
+            self.down = True
+            self.ox = self.oy = 0.0
+            steps.append(("touch_start", self.__pos()))
+        for i in range(MouseLook.MAX_RECENTERS):
+            if dx == 0 and dy == 0:
+                break
+            ox = self.ox + dx
+            oy = self.oy + dy
+            if ox * ox + oy * oy <= 1:
+                self.ox = ox
+                self.oy = oy
+                steps.append(("touch_move", self.__pos()))
+                break
+            # up to the edge, the rest again from the anchor
+            a = dx * dx + dy * dy
+            b = 2 * (self.ox * dx + self.oy * dy)
+            c = self.ox * self.ox + self.oy * self.oy - 1
+            t = (-b + math.sqrt(max(0.0, b * b - 4 * a * c))) / (2 * a)
+            self.ox += dx * t
+            self.oy += dy * t
+            steps.append(("touch_move", self.__pos()))
+            steps.append(("touch_end", ()))
+            self.ox = self.oy = 0.0
+            steps.append(("touch_start", self.__pos()))
+            dx *= 1 - t
+            dy *= 1 - t
+        return steps
+
+    def lift(self):
+        if not self.down:
+            return []
+        self.down = False
+        return [("touch_end", ())]
+#endregion
+
+#region Screen
+# raw screencap output: width, height, pixel format, from Android 9 on a color space, then the pixels
+RAW_HEADER = struct.Struct("<III")
+# pixel format -> bytes per pixel
+RAW_FORMATS = {1: 4, 2: 4, 3: 3, 4: 2, 5: 4}
+
+def raw_layout(data, size=None):
+    # -> (width, height, bytes per pixel, header size), size is the whole frame's length
+    width, height, fmt = RAW_HEADER.unpack_from(data)
+    bpp = RAW_FORMATS.get(fmt)
+    if bpp is None:
+        raise ValueError(f"unsupported screencap pixel format {fmt}")
+    header = (len(data) if size is None else size) - width * height * bpp
+    if header != 12 and header != 16:
+        raise ValueError("not a raw screencap frame")
+    return width, height, bpp, header
+
+def read_raw(path):
+    # a frame saved with "adb exec-out screencap > frame.raw"
+    with open(path, "rb") as f:
+        return f.read()
+
+class ScreenCapture:
+    # raw frames over one persistent shell, each read into the same buffer
+    def __init__(self, open_channel):
+        # () -> (write, read_into, close)
+        self.open_channel = open_channel
+        self.channel = None
+        self.frame = None
+        self.view = None
+
+    def __read(self, view):
+        read_into = self.channel[1]
+        while len(view) > 0:
+            n = read_into(view)
+            if n == 0:
+                raise AdbError("screen capture channel closed")
+            view = view[n:]
+
+    def __line(self):
+        line = bytearray()
+        byte = bytearray(1)
+        while byte != b"\n":
+            self.__read(memoryview(byte))
+            line += byte
+        return line.decode()
+
+    def capture(self):
+        if self.channel is None:
+            self.channel = self.open_channel()
+            # the frame size, which also tells the header size, once per channel
+            self.channel[0](b"screencap | wc -c\n")
+            size = int(self.__line())
+            if self.frame is None or len(self.frame) != size:
+                self.frame = bytearray(size)
+                self.view = memoryview(self.frame)
+        self.channel[0](b"screencap\n")
+        self.__read(self.view)
+        return self.frame
+
+    def close(self):
+        if self.channel is None:
+            return
+        try:
+            self.channel[2]()
+        except OSError:
+            pass
+        self.channel = None
+
+class ScreenRegion:
+    __slots__ = ("rect", "threshold", "ref", "diff")
+
+    def __init__(self, rect, threshold, ref, diff):
+        # screen fractions (left, top, right, bottom), mean RGB difference still counted as a match,
+        # reference patch and scratch space, both int16
+        self.rect = rect
+        self.threshold = threshold
+        self.ref = ref
+        self.diff = diff
+
+class ScreenWatch:
+    # named screen regions compared with reference patches cut from recorded raw frames,
+    # bindings test them with "if <region>" or wait for them with "when <region> <ms>"
+    def __init__(self, config, capture, execute_soon):
+        self.capture = capture
+        self.execute_soon = execute_soon
+        # captures are rate limited, the device renders the whole screen for each one
+        self.interval = float(config.get("interval_ms", 100)) / 1000
+        self.regions = {}
+        self.matched = {}
+        # (region, fn, args, deadline) of "when" bindings still waiting
+        self.waiters = []
+        self.lock = threading.Lock()
+        self.frames = 0
+        self.started = None
+        self.thread = None
+        try:
+            import numpy
+        except ImportError:
+            print("Screen watch needs numpy (\"pip install numpy\"), bindings with screen conditions are off")
+            self.np = None
+            return
+        self.np = numpy
+        for name, region in config.get("regions", {}).items():
+            try:
+                rect = tuple([float(e) for e in region["rect"]])
+                ref = ScreenWatch.__cut(self.__pixels(read_raw(region["ref"])), rect).astype(numpy.int16)
+            except (KeyError, OSError, ValueError, TypeError) as e:
+                print(f"Invalid screen region {name}: {e}")
+                continue
+            self.regions[name] = ScreenRegion(rect, float(region.get("threshold", 16)), ref, numpy.empty_like(ref))
+            self.matched[name] = False
+
+    def __pixels(self, frame):
+        # a (height, width, bytes per pixel) view of the frame, nothing is copied
+        width, height, bpp, header = raw_layout(frame)
+        if bpp < 3:
+            raise ValueError("screen watch needs 24 or 32 bit frames")
+        return self.np.frombuffer(frame, self.np.uint8, width * height * bpp, header).reshape(height, width, bpp)
+
+    def __cut(pixels, rect):
+        height, width = pixels.shape[:2]
+        left, top, right, bottom = rect
+        return pixels[int(top * height):int(bottom * height), int(left * width):int(right * width), :3]
+
+    def check(self, frame):
+        # one raw frame -> {region: matched}, waiting bindings whose region showed up are run
+        np = self.np
+        pixels = self.__pixels(frame)
+        matched = {}
+        for name, region in self.regions.items():
+            patch = ScreenWatch.__cut(pixels, region.rect)
+            if patch.shape != region.ref.shape:
+                matched[name] = False
+                continue
+            diff = region.diff
+            np.copyto(diff, patch, casting="unsafe")
+            np.subtract(diff, region.ref, out=diff)
+            np.abs(diff, out=diff)
+            matched[name] = float(diff.mean()) <= region.threshold
+        self.matched = matched
+        self.frames += 1
+        if len(self.waiters) > 0:
+            self.__wake(time.perf_counter())
+        return matched
+
+    def wait(self, name, fn, args, timeout):
+        with self.lock:
+            self.waiters.append((name, fn, args, time.perf_counter() + timeout))
+
+    def __wake(self, now):
+        with self.lock:
+            waiters = self.waiters
+            self.waiters = []
+            for waiter in waiters:
+                name, fn, args, deadline = waiter
+                if self.matched.get(name, False):
+                    self.execute_soon(fn, args)
+                elif now < deadline:
+                    self.waiters.append(waiter)
+                else:
+                    print(f"Gave up waiting for {name}")
+
+    def start(self):
+        if self.thread is not None or len(self.regions) == 0:
+            return
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def report(self):
+        # the capture rate reached against the one asked for, a slow screencap shows up here first
+        elapsed = time.perf_counter() - self.started if self.started is not None else 0
+        rate = self.frames / elapsed if elapsed > 0 else 0
+        asked = f"{1 / self.interval:.1f}/s" if self.interval > 0 else "as fast as possible"
+        matched = ", ".join([name for name, on in self.matched.items() if on]) or "none"
+        return f"screen: {self.frames} frames, {rate:.1f}/s ({asked} asked), matching: {matched}"
+
+    def __run(self):
+        while True:
+            start = time.perf_counter()
+            try:
+                self.check(self.capture.capture())
+            except (OSError, ValueError, AdbError) as e:
+                print(f"Screen capture failed: {e}")
+                self.capture.close()
+                time.sleep(1)
+            time.sleep(max(0, start + self.interval - time.perf_counter()))
+#endregion
+
+#region Gesture
+EASINGS = {
+    "linear": lambda t: t,
+    "ease_in": lambda t: t * t,
+    "ease_out": lambda t: 1 - (1 - t) * (1 - t),
+    "ease_in_out": lambda t: 3 * t * t - 2 * t * t * t,
+}
+
+def interpolate(x, y, x_dst, y_dst, steps, easing="linear"):
+    ease = EASINGS[easing]
+    points = []
+    for i in range(1, steps + 1):
+        t = ease(i / steps)
+        points.append((int(round(x + (x_dst - x) * t)), int(round(y + (y_dst - y) * t))))
+    return points
+#endregion
+
+#region ADB Scheduler
+from collections import deque
+
+TASK_RELEASE = 0
+TASK_PRESS = 1
+TASK_MOVE = 2
+# ordered like presses, but never dropped or expired: stick swaps and toggles
+TASK_STATE = 3
+
+class Timer:
+    __slots__ = ("due", "period", "fn", "args", "rounds", "cancelled")
+
+    def __init__(self, due, period, fn, args):
+        self.due = due
+        self.period = period
+        self.fn = fn
+        self.args = args
+        self.rounds = 0
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class TimerWheel:
+    # hashed timer wheel: O(1) schedule and cancel, one thread fires due timers at resolution granularity,
+    # finding the next one looks at most one turn ahead of the cursor.
+    # it waits on an event until just before the next due time, then sleeps the rest at the OS timer resolution
+    def __init__(self, resolution=0.001, size=512):
+        self.resolution = resolution
+        self.size = size
+        self.slots = [[] for i in range(size)]
+        self.origin = time.perf_counter()
+        # next tick to process
+        self.tick = 0
+        self.count = 0
+        self.oneshots = 0
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+        self.late = Histogram()
+
+    def __insert(self, timer):
+        tick = max(math.ceil((timer.due - self.origin) / self.resolution), self.tick)
+        timer.rounds = (tick - self.tick) // self.size
+        self.slots[tick % self.size].append(timer)
+
+    def call_at(self, due, fn, *args, period=0):
+        timer = Timer(due, period, fn, args)
+        with self.lock:
+            if self.count == 0:
+                # the cursor stood still while the wheel was empty
+                self.tick = int((time.perf_counter() - self.origin) / self.resolution)
+            self.__insert(timer)
+            self.count += 1
+            if period == 0:
+                self.oneshots += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.__run, daemon=True)
+                self.thread.start()
+        self.wake.set()
+        return timer
+
+    def call_later(self, delay, fn, *args):
+        return self.call_at(time.perf_counter() + delay, fn, *args)
+
+    def call_every(self, period, fn, *args, first=None):
+        due = time.perf_counter() + (period if first is None else first)
+        return self.call_at(due, fn, *args, period=period)
+
+    def pending(self):
+        # one-shot timers not fired yet, repeating ones never finish
+        return self.oneshots
+
+    def __expire(self, now):
+        now_tick = int((now - self.origin) / self.resolution)
+        fired = []
+        if now_tick - self.tick >= self.size:
+            # more than a turn behind, after a long wait or a stalled thread: sort every timer once
+            # instead of walking each tick under the lock
+            timers = [timer for slot in self.slots for timer in slot]
+            self.slots = [[] for i in range(self.size)]
+            self.tick = now_tick + 1
+            for timer in timers:
+                if timer.cancelled:
+                    self.count -= 1
+                    if timer.period == 0:
+                        self.oneshots -= 1
+                elif timer.due <= now:
+                    fired.append(timer)
+                else:
+                    self.__insert(timer)
+        while self.tick <= now_tick:
+            if self.count == 0:
+                self.tick = now_tick + 1
+                break
+            index = self.tick % self.size
+            slot = self.slots[index]
+            if len(slot) > 0:
+                keep = []
+                for timer in slot:
+                    if timer.cancelled:
+                        self.count -= 1
+                        if timer.period == 0:
+                            self.oneshots -= 1
+                    elif timer.rounds > 0:
+                        timer.rounds -= 1
+                        keep.append(timer)
+                    else:
+                        fired.append(timer)
+                self.slots[index] = keep
+            self.tick += 1
+        for timer in fired:
+            if timer.period > 0:
+                # missed periods are skipped, not replayed in a burst
+                timer.due += timer.period
+                if timer.due <= now:
+                    timer.due += math.ceil((now - timer.due) / timer.period) * timer.period
+                self.__insert(timer)
+        return fired
+
+    def __next_due(self):
+        if self.count == 0:
+            return None
+        # the first tick from the cursor holding a timer in its last round, waking earlier finds nothing to fire
+        for i in range(self.size):
+            tick = self.tick + i
+            for timer in self.slots[tick % self.size]:
+                if timer.rounds == 0 and not timer.cancelled:
+                    return self.origin + tick * self.resolution
+        # everything is a turn or more away, come back after this one
+        return self.origin + (self.tick + self.size) * self.resolution
+
+    def __run(self):
+        while True:
+            now = time.perf_counter()
+            with self.lock:
+                fired = self.__expire(now)
+            for timer in fired:
+                if timer.cancelled:
+                    continue
+                self.late.add(time.perf_counter() - timer.due)
+                try:
+                    timer.fn(*timer.args)
+                except Exception as e:
+                    print(f"Error: {e}")
+                    debug_traceback(e)
+            with self.lock:
+                for timer in fired:
+                    if timer.period == 0:
+                        self.count -= 1
+                        self.oneshots -= 1
+                due = self.__next_due()
+            self.__sleep(due)
+
+    def __sleep(self, due):
+        if due is None:
+            self.wake.wait()
+            self.wake.clear()
+            return
+        remaining = due - time.perf_counter()
+        if remaining > 0.002:
+            if self.wake.wait(remaining - 0.002):
+                # an earlier timer came in
+                self.wake.clear()
+                return
+            remaining = due - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+
+class LoopTimers:
+    # the TimerWheel interface on an asyncio event loop, for the async core: timers fire as loop callbacks
+    # next to the input and the injection they feed. due times stay perf_counter based
+    def __init__(self, loop):
+        self.loop = loop
+        self.oneshots = 0
+        self.late = Histogram()
+
+    def __on_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def __schedule(self, timer):
+        self.loop.call_at(self.loop.time() + timer.due - time.perf_counter(), self.__fire, timer)
+
+    def call_at(self, due, fn, *args, period=0):
+        timer = Timer(due, period, fn, args)
+        if period == 0:
+            self.oneshots += 1
+        if self.__on_loop():
+            self.__schedule(timer)
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.__schedule, timer)
+        return timer
+
+    def call_later(self, delay, fn, *args):
+        return self.call_at(time.perf_counter() + delay, fn, *args)
+
+    def call_every(self, period, fn, *args, first=None):
+        due = time.perf_counter() + (period if first is None else first)
+        return self.call_at(due, fn, *args, period=period)
+
+    def pending(self):
+        return self.oneshots
+
+    def __fire(self, timer):
+        now = time.perf_counter()
+        if timer.due > now:
+            # the loop clock woke a little early, the callback goes back in for the rest
+            self.__schedule(timer)
+            return
+        if timer.period == 0:
+            self.oneshots -= 1
+        if timer.cancelled:
+            return
+        self.late.add(now - timer.due)
+        try:
+            timer.fn(*timer.args)
+        except Exception as e:
+            print(f"Error: {e}")
+            debug_traceback(e)
+        if timer.period > 0 and not timer.cancelled:
+            # missed periods are skipped, not replayed in a burst
+            timer.due += timer.period
+            if timer.due <= now:
+                timer.due += math.ceil((now - timer.due) / timer.period) * timer.period
+            self.__schedule(timer)
+
+class Channel:
+    # one bounded hop, with a policy per class of work:
+    # moves collapse to the latest per slot, presses expire past their deadline and give way when full,
+    # releases and state changes are never dropped
+    def __init__(self, depth=256, overflow="drop_oldest", move_deadline=0.1, press_deadline=1.0):
+        self.depth = depth
+        # "drop_oldest" evicts the oldest press for a new one, "drop_newest" refuses the new press
+        self.overflow = overflow
+        self.move_deadline = move_deadline
+        self.press_deadline = press_deadline
+        self.tasks = deque()
+        self.moves = {}
+        self.dropped = 0
+        self.collapsed = 0
+        self.expired = 0
+        self.high_water = 0
+
+    def __len__(self):
+        return len(self.tasks) + len(self.moves)
+
+    def full(self):
+        return len(self.tasks) >= self.depth
+
+    def put(self, priority, fn, args, slot, origin, stamp):
+        # stamp is when the work was created, deadlines count from there
+        if priority == TASK_MOVE:
+            if slot in self.moves:
+                self.collapsed += 1
+            expires = stamp + self.move_deadline if self.move_deadline > 0 else None
+            self.moves[slot] = (fn, args, expires, origin)
+            return True
+        if priority == TASK_RELEASE and slot in self.moves:
+            # the finger lifts where its last move put it, so that move goes first and no longer expires
+            fn_move, args_move, expires, origin_move = self.moves.pop(slot)
+            self.tasks.append((TASK_MOVE, fn_move, args_move, slot, origin_move, None))
+        expires = None
+        if priority == TASK_PRESS:
+            if len(self.tasks) >= self.depth and (self.overflow == "drop_newest" or not self.__evict()):
+                self.dropped += 1
+                return False
+            if self.press_deadline > 0:
+                expires = stamp + self.press_deadline
+        self.tasks.append((priority, fn, args, slot, origin, expires))
+        if len(self.tasks) > self.high_water:
+            self.high_water = len(self.tasks)
+        return True
+
+    def __evict(self):
+        for i in range(len(self.tasks)):
+            if self.tasks[i][0] == TASK_PRESS:
+                del self.tasks[i]
+                self.dropped += 1
+                return True
+        return False
+
+    def __take(self):
+        # releases jump the queue, but never ahead of earlier work on their own slot
+        tasks = self.tasks
+        busy = set()
+        for i in range(len(tasks)):
+            task = tasks[i]
+            if task[0] == TASK_RELEASE and task[3] not in busy:
+                del tasks[i]
+                return task
+            busy.add(task[3])
+        return tasks.popleft()
+
+    def take(self, now):
+        batch = []
+        while len(self.tasks) > 0:
+            priority, fn, args, slot, origin, expires = self.__take()
+            if expires is not None and now > expires:
+                self.expired += 1
+                continue
+            batch.append((fn, args, origin))
+        for fn, args, expires, origin in self.moves.values():
+            if expires is not None and now > expires:
+                self.expired += 1
+                continue
+            batch.append((fn, args, origin))
+        self.moves.clear()
+        return batch
+
+    def stats(self):
+        return {"depth": self.depth, "high_water": self.high_water, "dropped": self.dropped,
+                "collapsed": self.collapsed, "expired": self.expired}
+
+def overload_report(channels):
+    # name -> Channel stats, for sizing depth and deadlines
+    lines = [f"{'channel':<24} {'depth':>6} {'high':>6} {'dropped':>8} {'collapsed':>10} {'expired':>8} {'stalls':>7}"]
+    for name, s in channels:
+        lines.append(f"{name:<24} {s['depth']:>6} {s['high_water']:>6} {s['dropped']:>8} {s['collapsed']:>10} {s['expired']:>8} {s.get('stalls', 0):>7}")
+    return "\n".join(lines)
+
+def lateness_report(timers):
+    # name -> Histogram of how late timers fired, gesture steps and repeats inherit it
+    lines = [f"{'timers':<24} {'fired':>8} {'late p50 ms':>12} {'p99 ms':>8} {'max ms':>8}"]
+    for name, late in timers:
+        lines.append(f"{name:<24} {late.n:>8} {late.percentile(50) * 1000:>12.2f} {late.percentile(99) * 1000:>8.2f} {late.percentile(100) * 1000:>8.2f}")
+    return "\n".join(lines)
+
+class AdbScheduler:
+    # while a flush fails the device is stalled, the worker retries it with backoff
+    # and leaves new work in its lane, where it collapses and expires instead of bursting out later
+    MAX_BACKOFF = 1.0
+
+    def __init__(self, run, flush, workers=1, depth=256, overflow="drop_oldest", deadline=0.1, tracer=None, timers=None, press_deadline=1.0):
+        self.run = run
+        self.flush = flush
+        self.tracer = tracer
+        # TimerWheel or LoopTimers feeding submit(), idle waits for their one-shot timers too
+        self.timers = timers
+        # "drop_oldest", "drop_newest" or "block" when a lane is full
+        self.overflow = overflow
+        self.cond = threading.Condition()
+        self.lanes = [Channel(depth, "drop_newest" if overflow == "drop_newest" else "drop_oldest", deadline, press_deadline) for i in range(workers)]
+        self.next_lane = 0
+        self.stalls = 0
+        # workers start with the first task, an async core may take over before that
+        self.threads = []
+
+    def start(self):
+        self.threads = [threading.Thread(target=self.__work, args=(lane,), daemon=True) for lane in self.lanes]
+        for t in self.threads:
+            t.start()
+
+    def __lane(self, slot):
+        if slot is None:
+            # slotless tasks are independent, spread them over the workers
+            self.next_lane = (self.next_lane + 1) % len(self.lanes)
+            return self.lanes[self.next_lane]
+        return self.lanes[hash(slot) % len(self.lanes)]
+
+    def __put(self, fn, args, priority, slot, block, origin):
+        lane = self.__lane(slot)
+        if self.overflow == "block" and block and priority != TASK_MOVE:
+            while lane.full():
+                self.cond.wait()
+        return lane.put(priority, fn, args, slot, origin, time.perf_counter())
+
+    def put(self, fn, args, priority, slot=None, origin=None):
+        with self.cond:
+            if len(self.threads) == 0:
+                self.start()
+            ok = self.__put(fn, args, priority, slot, True, origin)
+            self.cond.notify_all()
+            return ok
+
+    def submit(self, fn, args, priority, slot=None, origin=None):
+        # from the timer thread, which must never block on a full lane
+        with self.cond:
+            if len(self.threads) == 0:
+                self.start()
+            self.__put(fn, args, priority, slot, False, origin)
+            self.cond.notify_all()
+
+    def busy(self):
+        if self.timers is not None and self.timers.pending() > 0:
+            return True
+        return any([len(l) > 0 for l in self.lanes])
+
+    def stats(self):
+        s = {"depth": 0, "high_water": 0, "dropped": 0, "collapsed": 0, "expired": 0}
+        for lane in self.lanes:
+            for k, v in lane.stats().items():
+                s[k] = max(s[k], v) if k == "depth" or k == "high_water" else s[k] + v
+        s["stalls"] = self.stalls
+        return s
+
+    def wait_idle(self, timeout=10):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            with self.cond:
+                if not self.busy():
+                    break
+            time.sleep(0.01)
+        # the last drained batch may still be writing
+        time.sleep(0.2)
+
+    async def idle(self, timeout=10):
+        await asyncio.get_running_loop().run_in_executor(None, self.wait_idle, timeout)
+
+    def take_batch(self, lane):
+        return lane.take(time.perf_counter())
+
+    def __work(self, lane):
+        backoff = 0
+        while True:
+            if backoff > 0:
+                time.sleep(backoff)
+                if not self.flush():
+                    backoff = min(backoff * 2, AdbScheduler.MAX_BACKOFF)
+                    continue
+                backoff = 0
+            with self.cond:
+                while len(lane) == 0:
+                    self.cond.wait()
+                batch = self.take_batch(lane)
+                self.cond.notify_all()
+            if not self.run_batch(batch):
+                self.stalls += 1
+                backoff = 0.01
+
+    def run_batch(self, batch):
+        tracer = self.tracer
+        for fn, args, origin in batch:
+            if tracer is not None and origin is not None:
+                tracer.record(fn, "dequeue", origin)
+            try:
+                self.run(fn, args)
+            except Exception as e:
+                print(f"Error: {e}")
+                debug_traceback(e)
+        ok = self.flush()
+        if tracer is not None:
+            for fn, args, origin in batch:
+                if origin is not None:
+                    tracer.record(fn, "write", origin)
+        return ok
+
+class AsyncScheduler(AdbScheduler):
+    # the same lanes drained by event loop callbacks,
+    # while a stream is congested or reconnecting the drain waits, so moves keep coalescing
+    def __init__(self, loop, run, flush, streams, depth=256, overflow="drop_oldest", deadline=0.1, tracer=None, timers=None, press_deadline=1.0, high_water=1 << 16):
+        if overflow == "block":
+            # blocking the loop would stall the input it is waiting on
+            overflow = "drop_oldest"
+        super().__init__(run, flush, 1, depth, overflow, deadline, tracer, timers, press_deadline)
+        self.loop = loop
+        self.streams = streams
+        self.high_water = high_water
+        self.lane = self.lanes[0]
+        self.scheduled = False
+        self.backoff = 0
+
+    def start(self):
+        pass
+
+    def put(self, fn, args, priority, slot=None, origin=None):
+        ok = super().put(fn, args, priority, slot, origin)
+        if not self.scheduled:
+            self.scheduled = True
+            self.loop.call_soon(self.__drain)
+        return ok
+
+    def submit(self, fn, args, priority, slot=None, origin=None):
+        # loop timers submit on the loop itself, other threads hand over to it
+        try:
+            if asyncio.get_running_loop() is self.loop:
+                self.put(fn, args, priority, slot, origin)
+                return
+        except RuntimeError:
+            pass
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.put, fn, args, priority, slot, origin)
+
+    def __drain(self):
+        if self.backoff > 0 or any([s.backlog() > self.high_water for s in self.streams]):
+            self.loop.create_task(self.__resume())
+            return
+        self.scheduled = False
+        with self.cond:
+            batch = self.take_batch(self.lane)
+        if not self.run_batch(batch):
+            self.stalls += 1
+            self.backoff = 0.01
+            if not self.scheduled:
+                self.scheduled = True
+                self.loop.create_task(self.__resume())
+
+    async def __resume(self):
+        if self.backoff > 0:
+            await asyncio.sleep(self.backoff)
+            if self.flush():
+                self.backoff = 0
+            else:
+                self.backoff = min(self.backoff * 2, AdbScheduler.MAX_BACKOFF)
+                self.loop.create_task(self.__resume())
+                return
+        for s in self.streams:
+            await s.drain()
+        self.__drain()
+
+    def busy(self):
+        return self.scheduled or super().busy()
+
+    def wait_idle(self, timeout=10):
+        # from another thread, the loop keeps draining meanwhile
+        deadline = time.perf_counter() + timeout
+        while not self.loop.is_closed() and self.busy() and time.perf_counter() < deadline:
+            time.sleep(0.01)
+
+    async def idle(self, timeout=10):
+        deadline = time.perf_counter() + timeout
+        while self.busy() and time.perf_counter() < deadline:
+            await asyncio.sleep(0.005)
+        for s in self.streams:
+            await s.drain()
+#endregion
+
 class Adb:
-    def __init__(self, config):
+    def __init__(self, config, refresh=False):
         adb_path = config["adb"]["path"]
         self.config = config
+        self.adb_path = adb_path
         self.adb_prefix = f"\"{adb_path}\""
+        self.adb_device = None
+        # "shell": persistent adb shell session, "process": one adb process per command,
+        # "binary": raw input_event frames written to the event node
+        self.backend = config["adb"].get("backend", "shell")
+        self.shell = None
+        self.stream = None
+        self.writer = None
+        # "exe": run the adb binary, "socket": talk to the adb server on port 5037 directly
+        self.client = None
+        if config["adb"].get("client", "exe") == "socket":
+            self.client = AdbClient(port=int(config["adb"].get("server_port", 5037)))
+        root_path = os.path.dirname(os.path.abspath(__file__))
+        self.profiles = DeviceProfiles(config["adb"].get("profiles", f"{root_path}/profiles.json"))
         self.screen_width = 0
         self.screen_height = 0
-        self.mouse_handle_count = 0
-        self.mouse_handle_cycle = 5
-        self.mt = MultiTouch()
-        self.__adb_setup()
+        self.orientation = 0
+        self.abs_ranges = {}
+        self.slot_count = 0
+        self.word_size = 64
+        # pad key -> Joystick, registered by Mapper.compile
+        self.sticks = {}
+        # swipe_area key -> MouseLook while mouse-look is on
+        self.looks = {}
+        self.touch = None
+        # "raw": taps and swipes as multitouch events, "input": the device's input tap/swipe command
+        gesture = config.get("gesture", {})
+        self.gesture_mode = gesture.get("mode", "raw")
+        self.gesture_steps = int(gesture.get("steps", 8))
+        self.gesture_duration = float(gesture.get("duration_ms", 80)) / 1000
+        self.gesture_easing = gesture.get("easing", "ease_out")
+        self.tap_duration = float(gesture.get("tap_ms", 30)) / 1000
+        self.gesture_count = 0
+        self.tracer = LatencyTracer() if config.get("trace", False) else None
+        self.__adb_setup(refresh)
+        self.__touch_setup()
         self.__adb_executor_setup()
+        # screen regions for conditional bindings, captured once a reactor attaches
+        self.screen = None
+        if "watch" in config:
+            self.screen = ScreenWatch(config["watch"], ScreenCapture(self.__screen_channel), self.__submit)
 
     def __adb_executor_setup(self):
-        self.task_queue = queue.Queue()
-        self.executor = threading.Thread(
-            target=Adb.__adb_executor, args=(self,))
-        self.executor.start()
-
-    def __adb_executor(adb):
-        while True:
-            task_move_args = None
-            tasks = []
-
-            while True:
-                fn, args = adb.task_queue.get()
-                if fn == "touch_move":
-                    task_move_args = args
-                else:
-                    tasks.append((fn, args))
-                if adb.task_queue.empty():
-                    break
-
-            for t in tasks:
-                fn, args = t
-                getattr(adb, fn)(*args)
-            if task_move_args != None:
-                adb.touch_move(*task_move_args)
+        adb = self.config["adb"]
+        workers = int(adb.get("workers", 1))
+        if workers > 1 and self.backend != "process":
+            # shell and binary backends share one stream, parallel workers would only contend for it
+            print(f"Backend {self.backend} is sequential, using 1 worker")
+            workers = 1
+        self.touch.parallel = workers > 1
+        self.scheduler_options = {
+            "depth": int(adb.get("queue_depth", 256)),
+            "overflow": adb.get("overflow", "drop_oldest"),
+            "deadline": float(adb.get("move_deadline_ms", 100)) / 1000,
+            # taps and gestures still queued this long after the input are dropped, 0 keeps them
+            "press_deadline": float(adb.get("press_deadline_ms", 1000)) / 1000,
+            "tracer": self.tracer,
+        }
+        self.timers = TimerWheel(float(adb.get("timer_resolution_ms", 1)) / 1000)
+        self.scheduler_options["timers"] = self.timers
+        self.scheduler = AdbScheduler(self.__run, self.flush, workers, **self.scheduler_options)
+
+    def start_async(self, loop):
+        # injection on the caller's event loop: streams write through asyncio transports
+        # and the scheduler drains in loop callbacks instead of worker threads, gesture and repeat timers are loop timers
+        self.timers = LoopTimers(loop)
+        self.scheduler_options["timers"] = self.timers
+        self.scheduler.timers = self.timers
+        if self.backend == "process":
+            print("Backend process runs one adb per command, keeping worker threads")
+            return
+        streams = [s for s in [self.shell.stream, self.stream] if s is not None]
+        for s in streams:
+            s.attach(loop)
+        self.scheduler = AsyncScheduler(loop, self.__run, self.flush, streams, **self.scheduler_options)
 
-    def __adb_executor_queue(self, fn, args):
-        self.task_queue.put((fn, args))
+    def __run(self, fn, args):
+        getattr(self, fn)(*args)
 
     def __adb(self, cmd):
         os.system(f"{self.adb_prefix} {cmd}")
@@ -219,11 +1936,97 @@ class Adb:
     def __adb_r(self, cmd):
         return os.popen(f"{self.adb_prefix} {cmd}").read()
 
+    def __adb_shell_r(self, cmd):
+        if self.client is not None:
+            return self.client.shell(self.adb_device, cmd)
+        return self.__adb_r(f"shell \"{cmd}\"")
+
+    def __adb_word_size(self):
+        abi = self.__adb_shell_r("getprop ro.product.cpu.abi").strip()
+        return 64 if "64" in abi else 32
+
+    def __adb_stream(self, cmd):
+        if self.client is not None:
+            return self.client.stream(self.adb_device, f"exec:{cmd}")
+        if cmd == "sh":
+            return AdbStream([self.adb_path, "-s", self.adb_device, "shell"])
+        return AdbStream([self.adb_path, "-s", self.adb_device, "exec-in", cmd])
+
+    def __shell_setup(self):
+        if self.backend != "process":
+            self.shell = AdbShell(self.__adb_stream("sh"))
+        if self.backend == "binary":
+            word_size = int(self.config["adb"].get("word_size", self.word_size))
+            print(f"Using binary events, word size: {word_size}")
+            self.stream = self.__adb_stream(f"cat > {self.adb_event}")
+            self.writer = BinaryEventWriter(self.stream, word_size)
+        else:
+            self.writer = SendeventWriter(self.__shell, self.adb_event)
+
+    def __shell(self, cmd):
+        if self.shell is not None:
+            self.shell.write(cmd)
+        elif self.client is not None:
+            self.client.shell(self.adb_device, cmd)
+        else:
+            self.__adb(f"shell \"{cmd}\"")
+
+    def __screen_channel(self):
+        # a shell of its own, binary safe, for screencap frames
+        if self.client is not None:
+            sock = self.client.open_service(self.adb_device, "exec:sh")
+            return sock.sendall, sock.recv_into, sock.close
+        process = subprocess.Popen(
+            [self.adb_path, "-s", self.adb_device, "shell", "-T"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL)
+
+        def write(data):
+            process.stdin.write(data)
+            process.stdin.flush()
+        return write, process.stdout.readinto, process.kill
+
+    def getevent_channel(self):
+        # -> (read_into, close) of "getevent -t" on the injected node
+        cmd = f"getevent -t {self.adb_event}"
+        if self.client is not None:
+            sock = self.client.open_service(self.adb_device, f"exec:{cmd}")
+            return sock.recv_into, sock.close
+        process = subprocess.Popen(
+            [self.adb_path, "-s", self.adb_device, "exec-out", cmd],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0)
+        return process.stdout.readinto, process.kill
+
+    def __touch_setup(self):
+        max_tracking_id = self.abs_ranges.get("ABS_MT_TRACKING_ID", [0, 65535])[1]
+        self.touch = TouchEngine(self.slot_count, max_tracking_id, self.__frame)
+        self.__abs_setup()
+        print(f"Touch slots: {self.slot_count}")
+
+    def flush(self):
+        # False while the device can't take writes, they stay buffered for the retry
+        if self.touch is not None:
+            self.touch.commit()
+        ok = True
+        if self.shell is not None:
+            ok = self.shell.flush() and ok
+        if self.stream is not None:
+            ok = self.stream.flush() and ok
+        return ok
+
     def __adb_connect(self):
         ip_port = self.config["adb"]["ip_port"]
-        self.__adb(f"connect {ip_port} > nul")
+        if self.client is not None:
+            self.client.connect(ip_port)
+        else:
+            self.__adb(f"connect {ip_port} > {os.devnull}")
 
     def __adb_get_devices(self):
+        if self.client is not None:
+            return "List of devices attached\n" + self.client.host("host:devices")
         return self.__adb_r("devices")
 
     def __extract_event(self, event):
@@ -232,8 +2035,14 @@ class Adb:
         num, name = match.groups()
         return ("/dev/input/event" + num, name)
 
+    def __extract_abs(self, event):
+        ranges = {}
+        for name, lo, hi in re.findall(r'(ABS_\w+)\s*:\s*value\s+-?\d+,\s*min\s+(-?\d+),\s*max\s+(-?\d+)', event):
+            ranges[name] = [int(lo), int(hi)]
+        return ranges
+
     def __adb_get_event(self):
-        events = self.__adb_r("shell getevent -pl")
+        events = self.__adb_shell_r("getevent -pl")
         events = events.split("/dev/input/event")
         events = events[1:]
         events = [e for e in events if "ABS_MT_SLOT" in e]
@@ -249,89 +2058,540 @@ class Adb:
                 print(f"{i}: {e_name}")
             index = int(input("Select an event: "))
         self.adb_event, _ = self.__extract_event(events[index])
+        self.abs_ranges = self.__extract_abs(events[index])
+        self.slot_count = self.abs_ranges["ABS_MT_SLOT"][1] + 1
         print(f"Using event: {self.adb_event}")
 
-    def __adb_screen_size(self):
-        size_str = self.__adb_r("shell wm size")
+    def __extract_screen_size(self, size_str):
         size_arr = size_str.split()[2].split("x")
-        self.screen_width = int(size_arr[1])
-        self.screen_height = int(size_arr[0])
+        return int(size_arr[1]), int(size_arr[0])
 
-    def __adb_setup(self):
-        self.__adb_connect()
+    def __adb_screen_size(self):
+        size_str = self.__adb_shell_r("wm size")
+        self.screen_width, self.screen_height = self.__extract_screen_size(size_str)
+
+    # the one line of the input dump the rotation is read from, filtered on the device
+    ORIENTATION = "dumpsys input | grep -m1 SurfaceOrientation"
+
+    def __adb_orientation(self):
+        match = re.search(r"SurfaceOrientation:\s*(\d)", self.__adb_shell_r(Adb.ORIENTATION))
+        self.orientation = int(match.group(1)) if match else 0
+
+    def __adb_use_device(self, target_device):
+        print(f"Using device: {target_device}")
+        self.adb_device = target_device
+        self.adb_prefix = f"{self.adb_prefix} -s {target_device}"
+
+    def __adb_profile(self):
+        return {
+            "device": self.adb_device,
+            "event": self.adb_event,
+            "abs": self.abs_ranges,
+            "slots": self.slot_count,
+            "screen": [self.screen_width, self.screen_height],
+            "orientation": self.orientation,
+            "word_size": self.word_size,
+        }
+
+    def __adb_apply_profile(self, profile):
+        self.adb_event = profile["event"]
+        self.abs_ranges = profile["abs"]
+        self.slot_count = profile["slots"]
+        self.screen_width, self.screen_height = profile["screen"]
+        self.orientation = profile["orientation"]
+        self.word_size = profile["word_size"]
+        print(f"Using event: {self.adb_event} (cached)")
+
+    def __adb_probe(self, profile):
+        # one round trip: the event node still exists and the screen size is unchanged -> the current rotation,
+        # None when the profile is stale
+        out = self.__adb_shell_r(f"test -c {profile['event']} && wm size && {Adb.ORIENTATION}")
+        try:
+            if list(self.__extract_screen_size(out)) != profile["screen"]:
+                return None
+        except (IndexError, ValueError):
+            return None
+        match = re.search(r"SurfaceOrientation:\s*(\d)", out)
+        return int(match.group(1)) if match else 0
+
+    def __adb_discover(self):
         devices = [d.split()[0] for d in self.__adb_get_devices().split("\n")[1:] if len(d) > 0]
         if len(devices) == 0:
             print("No device found.")
             exit()
+        serial = self.config["adb"]["ip_port"]
         if len(devices) == 1:
             target_device = devices[0]
+        elif serial in devices:
+            # the configured instance, several emulators are usually attached at once
+            target_device = serial
         else:
             for i in range(len(devices)):
                 print(f"{i}: {devices[i]}")
             index = int(input("Select a device: "))
             target_device = devices[index]
-        print(f"Using device: {target_device}")
-
+        self.__adb_use_device(target_device)
         self.__adb_get_event()
-        self.adb_prefix = f"{self.adb_prefix} -s {target_device}"
         self.__adb_screen_size()
+        self.__adb_orientation()
+        self.word_size = self.__adb_word_size()
+        # under the configured serial, the one the next start looks up, whichever device it resolved to
+        self.profiles.put(self.config["adb"]["ip_port"], self.__adb_profile())
+
+    def __adb_setup(self, refresh):
+        self.__adb_connect()
+        serial = self.config["adb"]["ip_port"]
+        if refresh:
+            self.profiles.invalidate(serial)
+        profile = self.profiles.get(serial)
+        if profile is not None:
+            self.__adb_use_device(profile.get("device", serial))
+            orientation = self.__adb_probe(profile)
+            if orientation is not None:
+                self.__adb_apply_profile(profile)
+                if orientation != profile["orientation"]:
+                    # rotated since it was cached, nothing else to rediscover
+                    print(f"Display rotated to {orientation}")
+                    self.orientation = profile["orientation"] = orientation
+                    self.profiles.put(serial, profile)
+                self.__shell_setup()
+                return
+            print("Cached device profile is stale, rediscovering...")
+            self.profiles.invalidate(serial)
+            self.adb_prefix = f"\"{self.adb_path}\""
+        self.__adb_discover()
+        self.__shell_setup()
 
     def __coord(self, x, y):
         return (x * self.screen_width, y * self.screen_height)
 
-    def execute(self, fn, *args):
-        self.__adb_executor_queue(fn, args)
+    # fn -> (priority, index of the touch key argument), everything else is a slotless press
+    TASKS = {
+        "touch_start": (TASK_PRESS, 0),
+        "touch_move": (TASK_MOVE, 0),
+        "stick_move": (TASK_MOVE, 0),
+        # the centered and lifted stick, a move that must not expire
+        "stick_release": (TASK_RELEASE, 0),
+        "stick_toggle": (TASK_STATE, 0),
+        "stick_set": (TASK_STATE, 0),
+        "look_to": (TASK_MOVE, 0),
+        "look_toggle": (TASK_STATE, 0),
+        "touch_end": (TASK_RELEASE, 0),
+    }
+
+    def execute(self, fn, *args, origin=None):
+        priority, key = Adb.TASKS.get(fn, (TASK_PRESS, None))
+        if self.tracer is not None and origin is not None:
+            self.tracer.record(fn, "enqueue", origin)
+        self.scheduler.put(fn, args, priority, args[key] if key is not None else None, origin)
+
+    def __submit(self, fn, args):
+        priority, key = Adb.TASKS.get(fn, (TASK_PRESS, None))
+        self.scheduler.submit(fn, args, priority, args[key] if key is not None else None)
+
+    def execute_at(self, due, fn, *args):
+        # fn through the scheduler at due (perf_counter time), the returned Timer cancels it
+        return self.timers.call_at(due, self.__submit, fn, args)
+
+    def execute_every(self, period, fn, *args, first=None):
+        return self.timers.call_every(period, self.__submit, fn, args, first=first)
+
+    def __abs_setup(self):
+        # screen fraction (x, y) -> ABS_MT_POSITION units as (ax * x + bx * y + cx, ay * x + by * y + cy),
+        # undoing the display rotation
+        x_lo, x_hi = self.abs_ranges.get("ABS_MT_POSITION_X", [0, self.screen_width - 1])
+        y_lo, y_hi = self.abs_ranges.get("ABS_MT_POSITION_Y", [0, self.screen_height - 1])
+        dx = x_hi - x_lo
+        dy = y_hi - y_lo
+        self.abs_affine = {
+            0: (dx, 0, x_lo, 0, dy, y_lo),
+            1: (0, -dx, x_hi, dy, 0, y_lo),
+            2: (-dx, 0, x_hi, 0, -dy, y_hi),
+            3: (0, dx, x_lo, -dy, 0, y_hi),
+        }[self.orientation]
+
+    def abs_coord(self, x, y):
+        ax, bx, cx, ay, by, cy = self.abs_affine
+        return (int(ax * x + bx * y + cx), int(ay * x + by * y + cy))
+
+    def coord(self, x, y):
+        return self.__coord(x, y)
+
+    def point(self, x, y):
+        # the coordinates tap and drag expect for the active gesture mode
+        if self.gesture_mode == "raw":
+            return self.abs_coord(x, y)
+        return self.__coord(x, y)
+
+    def point_diff(self, x, y, x_diff, y_diff):
+        min_extent = min(self.screen_width, self.screen_height)
+        x_dst = x + x_diff * min_extent / 4 / self.screen_width
+        y_dst = y + y_diff * min_extent / 4 / self.screen_height
+        return self.point(x, y) + self.point(x_dst, y_dst)
+
+    def gesture(self, points, duration):
+        # touch down on the first point, walk the rest over duration, then lift
+        self.gesture_count += 1
+        key = ("gesture", self.gesture_count)
+        start = time.perf_counter()
+        self.touch_start(key, *points[0])
+        steps = len(points) - 1
+        step = duration / steps if steps > 0 else duration
+        for i in range(1, steps + 1):
+            self.execute_at(start + step * i, "touch_move", key, *points[i])
+        self.execute_at(start + step * (steps + 1), "touch_end", key)
+
+    def tap(self, x, y):
+        if self.gesture_mode == "raw":
+            self.gesture([(x, y)], self.tap_duration)
+        else:
+            self.__shell(f"input tap {x} {y}")
+
+    def drag(self, x, y, x_dst, y_dst):
+        if self.gesture_mode == "raw":
+            points = [(x, y)] + interpolate(x, y, x_dst, y_dst, self.gesture_steps, self.gesture_easing)
+            self.gesture(points, self.gesture_duration)
+        else:
+            self.__shell(f"input swipe {x} {y} {x_dst} {y_dst} {int(self.gesture_duration * 1000)}")
+
+    def press(self, x, y, duration):
+        # a touch held for duration seconds
+        if self.gesture_mode == "raw":
+            self.gesture([(x, y)], duration)
+        else:
+            self.__shell(f"input swipe {x} {y} {x} {y} {int(duration * 1000)}")
+
+    def combo(self, steps):
+        # (offset, fn, args) steps, timed from the first
+        start = time.perf_counter()
+        for delay, fn, args in steps:
+            if delay <= 0:
+                self.__run(fn, args)
+            else:
+                self.execute_at(start + delay, fn, *args)
 
     def click(self, x, y):
-        x, y = self.__coord(x, y)
-        self.__adb(f"shell input tap {x} {y}")
+        self.tap(*self.point(x, y))
 
     def swipe(self, x, y, x_dst, y_dst):
-        x, y = self.__coord(x, y)
-        x_dst, y_dst = self.__coord(x_dst, y_dst)
-        self.__adb(f"shell input swipe {x} {y} {x_dst} {y_dst} 20")
+        self.drag(*(self.point(x, y) + self.point(x_dst, y_dst)))
 
     def swipe_diff(self, x, y, x_diff, y_diff):
-        x, y = self.__coord(x, y)
-        min_extent = min(self.screen_width, self.screen_height)
-        x_diff = x_diff * min_extent / 4
-        y_diff = y_diff * min_extent / 4
-        self.__adb(f"shell input swipe {x} {y} {x + x_diff} {y + y_diff} 20")
+        self.drag(*self.point_diff(x, y, x_diff, y_diff))
 
-    def __event(self, cmd):
-        self.__adb(f"shell sendevent {self.adb_event} {cmd}")
+    def __frame(self, events):
+        self.writer.frame(events)
 
     def touch_start(self, key, x, y):
-        self.__event(f"{EV_ABS} {ABS_MT_SLOT} 0")
-        self.__event(f"{EV_ABS} {ABS_MT_TRACKING_ID} 66")
-        self.__event(f"{EV_ABS} {ABS_MT_POSITION_X} {0xea}")
-        self.__event(f"{EV_ABS} {ABS_MT_POSITION_Y} {0x1d7}")
-        self.__event(f"{EV_SYN} {SYN_REPORT} 0")
-        print(f"touch... start... {y} {x}")
+        if self.touch.down(key, x, y) < 0:
+            print(f"No free touch slot for {key}")
+            return False
         return True
 
-    def touch_move(self, x, y):
-        self.__event(f"{EV_ABS} {ABS_MT_SLOT} 0")
-        self.__event(f"{EV_ABS} {ABS_MT_POSITION_X} {0xea - int(y * 50)}")
-        self.__event(f"{EV_ABS} {ABS_MT_POSITION_Y} {0x1d7 + int(x * 50)}")
-        self.__event(f"{EV_SYN} {SYN_REPORT} 0")
-
-        print(f"Moving {x} {y}")
-        self.mouse_handle_count += 1
-        if self.mouse_handle_count == self.mouse_handle_cycle:
-            self.mouse_handle_count = 0
-            print(f"Moving {x} {y}")
+    def touch_move(self, key, x, y):
+        self.touch.move(key, x, y)
 
     def touch_end(self, key):
-        self.__event(f"{EV_ABS} {ABS_MT_SLOT} 0")
-        self.__event(f"{EV_ABS} {ABS_MT_TRACKING_ID} -1")
-        self.__event(f"{EV_SYN} {SYN_REPORT} 0")
-        print(f"touch... end...")
+        self.touch.up(key)
+
+    def joystick(self, key, x, y):
+        # the stick at screen fraction (x, y), radius as a fraction of the shorter display side
+        pad = self.config.get("pad", {})
+        # the display as the game sees it, wm size is already read landscape
+        w, h = self.screen_width, self.screen_height
+        radius = float(pad.get("radius", 0.08)) * min(w, h)
+        return Joystick(
+            self.abs_coord, x, y, radius / w, radius / h,
+            dead_zone=float(pad.get("dead_zone", 0.15)),
+            curve=float(pad.get("curve", 1.0)),
+            grid=int(pad.get("grid", 8)),
+            hysteresis=float(pad.get("hysteresis", 0.25)))
+
+    def attach_stick(self, key, stick):
+        if key not in self.sticks:
+            if stick is not None:
+                self.sticks[key] = stick
+            return
+        # a live stick is swapped on the injection worker, after its finger is lifted
+        self.execute("stick_set", key, stick)
+
+    def stick_set(self, key, stick):
+        self.stick_move(key, 0, 0)
+        if stick is None:
+            del self.sticks[key]
+        else:
+            self.sticks[key] = stick
+
+    def stick_move(self, key, x, y):
+        stick = self.sticks.get(key)
+        if stick is None:
+            return
+        touch = stick.update(x, y)
+        if touch is not None:
+            getattr(self, touch[0])(key, *touch[1])
+
+    def stick_release(self, key):
+        self.stick_move(key, 0, 0)
+
+    def stick_toggle(self, key):
+        stick = self.sticks.get(key)
+        if stick is None:
+            return
+        stick.enabled = not stick.enabled
+        print(f"Pad {'on' if stick.enabled else 'off'}")
+        self.stick_move(key, 0, 0)
+
+    def look_toggle(self, key, x, y):
+        # mouse-look anchored at screen fraction (x, y), the area's radius a fraction of the shorter display side
+        look = self.looks.pop(key, None)
+        if look is not None:
+            for fn, args in look.lift():
+                getattr(self, fn)(key, *args)
+            print("Look off")
+            return
+        # the display as the game sees it, wm size is already read landscape
+        w, h = self.screen_width, self.screen_height
+        radius = float(self.config.get("look", {}).get("radius", 0.15)) * min(w, h)
+        self.looks[key] = MouseLook(self.abs_coord, x, y, radius / w, radius / h)
+        print("Look on")
+
+    def look_to(self, key, x, y):
+        # (x, y): the motion since look_toggle, in screen fractions
+        look = self.looks.get(key)
+        if look is None:
+            return
+        for fn, args in look.update(x, y):
+            getattr(self, fn)(key, *args)
+            if fn == "touch_start":
+                # the finger lands on the anchor in a frame of its own, the drag from it follows
+                self.touch.commit()
+#endregion
+
+#region Probe
+class GeteventParser:
+    # "getevent -t" output fed in chunks of any size -> on_event(timestamp, type, code, value),
+    # one regex scan over the complete lines of a chunk, so lines of other events cost no Python work;
+    # type and code narrow it down, "/dev/input/eventN: " before the fields is skipped
+    def __init__(self, on_event, event_type=None, code=None):
+        self.on_event = on_event
+        self.event_type = event_type
+        self.code = code
+        t = b"([0-9a-f]{4})" if event_type is None else b"(%04x)" % event_type
+        c = b"([0-9a-f]{4})" if code is None else b"(%04x)" % code
+        self.pattern = re.compile(rb"\[ *(\d+\.\d+)\] (?:\S+: )?" + t + b" " + c + rb" ([0-9a-f]{8})")
+        self.buf = bytearray()
+
+    def feed(self, data):
+        buf = self.buf
+        buf += data
+        end = buf.rfind(b"\n") + 1
+        if end == 0:
+            return
+        on_event = self.on_event
+        for m in self.pattern.finditer(buf, 0, end):
+            ts, t, c, value = m.groups()
+            value = int(value, 16)
+            if value >= 0x80000000:
+                value -= 1 << 32
+            on_event(float(ts), int(t, 16), int(c, 16), value)
+        del buf[:end]
+
+class LoopbackProbe:
+    # taps along the middle of the top edge of the screen as the game sees it, whose position along the edge
+    # is their sequence number, read back with "getevent -t" on the injected node:
+    # "echo" is injection -> line back on the host, "device" injection -> kernel timestamp,
+    # which needs the device's wall clock to be the host's, as it is for an emulator on the same machine
+    KEY = "probe"
+    # screen fractions: from x, to x, at y
+    EDGE = (0.25, 0.75, 0.01)
+
+    def __init__(self, adb, count=200, rate=50, timeout=1.0):
+        self.adb = adb
+        self.count = count
+        self.rate = rate
+        self.timeout = timeout
+        self.action = "probe"
+        # position along the edge -> (perf_counter, wall clock) at injection
+        self.sent = {}
+        self.lock = threading.Lock()
+        self.skewed = 0
+        # the raw axis the edge runs along, rotation decides which: index into (x, y) and its event code
+        lo = adb.abs_coord(LoopbackProbe.EDGE[0], LoopbackProbe.EDGE[2])
+        hi = adb.abs_coord(LoopbackProbe.EDGE[1], LoopbackProbe.EDGE[2])
+        self.axis = 0 if lo[0] != hi[0] else 1
+        self.edge = (min(lo[self.axis], hi[self.axis]), max(lo[self.axis], hi[self.axis]), lo[1 - self.axis])
+        self.parser = GeteventParser(self.__event, EV_ABS, ABS_MT_POSITION_X if self.axis == 0 else ABS_MT_POSITION_Y)
+
+    def __read(self, read_into):
+        view = memoryview(bytearray(65536))
+        while True:
+            try:
+                n = read_into(view)
+            except OSError:
+                return
+            if n == 0:
+                return
+            self.parser.feed(view[:n])
+
+    def __event(self, ts, t, c, value):
+        now = time.perf_counter()
+        with self.lock:
+            sent = self.sent.pop(value, None)
+        if sent is None:
+            return
+        tracer = self.adb.tracer
+        echo = now - sent[0]
+        tracer.add(self.action, "echo", echo)
+        device = ts - sent[1]
+        if 0 <= device <= echo:
+            tracer.add(self.action, "device", device)
+        else:
+            self.skewed += 1
+
+    def run(self):
+        adb = self.adb
+        read_into, close = adb.getevent_channel()
+        reader = threading.Thread(target=self.__read, args=(read_into,), daemon=True)
+        reader.start()
+        # getevent lists the node before it streams
+        time.sleep(0.3)
+        lo, hi, across = self.edge
+        # consecutive values differ, the kernel drops an unchanged position
+        span = hi - lo
+        start = time.perf_counter()
+        for seq in range(self.count):
+            due = start + seq / self.rate
+            while time.perf_counter() < due:
+                time.sleep(0.0005)
+            along = lo + seq % span
+            now = time.perf_counter()
+            with self.lock:
+                self.sent[along] = (now, time.time())
+            x, y = (along, across) if self.axis == 0 else (across, along)
+            adb.execute("touch_start", LoopbackProbe.KEY, x, y, origin=now)
+            adb.execute("touch_end", LoopbackProbe.KEY, origin=now)
+        deadline = time.perf_counter() + self.timeout
+        while len(self.sent) > 0 and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        close()
+        adb.tracer.lost[self.action] = (len(self.sent), self.count)
+        if self.skewed > 0:
+            print(f"{self.action}: {self.skewed} device timestamps off the host clock, left out of \"device\"")
+#endregion
+
+#region Message
+# fixed-size desktop -> reactor message: type, modifiers, vk, x, y, timestamp
+MSG = struct.Struct("<BBHiid")
+MSG_EXIT = 0
+MSG_KEY_DOWN = 1
+MSG_KEY_UP = 2
+MSG_MOVE = 3
+MSG_LEFT = 4
+MSG_RIGHT = 5
+MSG_NAMES = ["exit", "key_down", "key_up", "move", "left", "right"]
+# channel class of each message type on the way into the reactor, key ups are never dropped
+MSG_CLASSES = [TASK_STATE, TASK_PRESS, TASK_RELEASE, TASK_MOVE, TASK_PRESS, TASK_PRESS]
+
+MOD_CTRL = 1
+MOD_SHIFT = 2
+MOD_ALT = 4
+MOD_PREFIXES = {"C": MOD_CTRL, "S": MOD_SHIFT, "A": MOD_ALT}
+
+# vk -> key name used by configs.json, None for unmapped keys
+KEY_NAMES = [None] * 256
+for vk in range(0x30, 0x3A):
+    # 0 ~ 9
+    KEY_NAMES[vk] = str(vk - 0x30)
+for vk in range(0x41, 0x5B):
+    # a ~ z
+    KEY_NAMES[vk] = chr(vk + 0x20)
+for vk in range(0x70, 0x7C):
+    # F1 ~ F12
+    KEY_NAMES[vk] = "F" + str(vk - 0x6F)
+
+class PointerSlot:
+    # latest pointer position in shared memory, a seqlock over [seq, x, y, timestamp_us]
+    def __init__(self):
+        self.data = mp.RawArray("q", 4)
+
+    def write(self, x, y, ts):
+        d = self.data
+        d[0] += 1
+        d[1] = x
+        d[2] = y
+        d[3] = int(ts * 1000000)
+        d[0] += 1
+
+    def read(self):
+        d = self.data
+        while True:
+            seq = d[0]
+            if seq & 1:
+                continue
+            x, y, ts = d[1], d[2], d[3]
+            if d[0] == seq:
+                return seq, x, y, ts / 1000000
+#endregion
+
+#region Record
+class Recorder:
+    # append-only file of raw MSG records, written off the input path
+    MAGIC = b"AKTR\x01"
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(Recorder.MAGIC)
+        self.queue = deque()
+        self.wake = threading.Event()
+        self.closed = False
+        self.count = 0
+        self.thread = threading.Thread(target=self.__work, daemon=True)
+        self.thread.start()
+
+    def record(self, t, mods, vk, x, y, ts):
+        self.queue.append(MSG.pack(t, mods, vk, x, y, ts))
+        self.wake.set()
+
+    def __work(self):
+        while True:
+            self.wake.wait()
+            self.wake.clear()
+            chunks = []
+            while len(self.queue) > 0:
+                chunks.append(self.queue.popleft())
+            if len(chunks) > 0:
+                self.file.write(b"".join(chunks))
+                self.file.flush()
+                self.count += len(chunks)
+            if self.closed:
+                return
+
+    def close(self):
+        self.closed = True
+        self.wake.set()
+        self.thread.join()
+        self.file.close()
+        print(f"Recorded {self.count} events to {self.path}")
+
+def read_records(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(Recorder.MAGIC):
+        raise ValueError(f"{path} is not an input recording")
+    # every appended session starts with the magic again, which no message type byte can begin
+    i = 0
+    while i + MSG.size <= len(data):
+        if data.startswith(Recorder.MAGIC, i):
+            i += len(Recorder.MAGIC)
+            continue
+        yield MSG.unpack_from(data, i)
+        i += MSG.size
 #endregion
 
 #region Window
 import threading
-from pynput import keyboard as Keyboard, mouse as Mouse
 
 class Desktop:
     def __init__(self):
@@ -339,31 +2599,27 @@ class Desktop:
         self.key_shift = False
         self.key_alt = False
         self.key_records = set()
-        self.key_worker = threading.Thread(target=self.key_work, args=(self,))
         self.mouse_x = -1
         self.mouse_y = -1
-        self.mouse_worker = threading.Thread(target=self.mouse_work, args=(self,))
 
-    def start(self, conn):
+    def start(self, conn, pointer=None):
+        from pynput import keyboard as Keyboard, mouse as Mouse
+        self.keyboard = Keyboard
+        self.mouse = Mouse
         self.conn = conn
-        self.key_worker.start()
-        self.mouse_worker.start()
-
-    def key_work(arg, _):
+        self.pointer = pointer
+        # the listeners are hook threads themselves, this process only waits on them
+        mouse_listener = Mouse.Listener(
+            on_move   = self.on_move,
+            on_click  = self.on_click,
+            on_scroll = self.on_scroll)
         key_listener = Keyboard.Listener(
-            on_press   = lambda k: arg.on_press(k),
-            on_release = lambda k: arg.on_release(k))
+            on_press   = self.on_press,
+            on_release = self.on_release)
+        mouse_listener.start()
         key_listener.start()
         key_listener.join()
 
-    def mouse_work(arg, _):
-        mouse_listener = Mouse.Listener(
-            on_move   = lambda x, y: arg.on_move(x, y),
-            on_click  = lambda x, y, b, p: arg.on_click(x, y, b, p),
-            on_scroll = lambda x, y, dx, dy: arg.on_scroll(x, y, dx, dy))
-        mouse_listener.start()
-        mouse_listener.join()
-
     def __format_key(self, vk, is_pressed):
         if vk in self.key_records and is_pressed:
             return None
@@ -380,26 +2636,18 @@ class Desktop:
         if vk == 0xA4 or vk == 0xA5:
             self.key_alt = is_pressed
             return None
-        if vk >= 0x70 and vk <= 0x7B:
-            # F1 ~ F12
-            return "F" + str(vk - 0x6F)
-        fk = ""
+        if vk >= 256 or KEY_NAMES[vk] is None:
+            return None
+        mods = 0
         if is_pressed:
             if self.key_ctrl:
-                fk += "C"
+                mods |= MOD_CTRL
             if self.key_shift:
-                fk += "S"
+                mods |= MOD_SHIFT
             if self.key_alt:
-                fk += "A"
-        if vk >= 0x30 and vk <= 0x39:
-            # 0 ~ 9
-            fk += str(vk - 0x30)
-        elif vk >= 0x41 and vk <= 0x5A:
-            # a ~ z
-            fk += chr(vk + 0x20)
-        else:
-            return None
-        return fk if is_pressed else "!" + fk
+                mods |= MOD_ALT
+        t = MSG_KEY_DOWN if is_pressed else MSG_KEY_UP
+        return MSG.pack(t, mods, vk, 0, 0, time.perf_counter())
 
     def __to_vk(key):
         if hasattr(key, "value"):
@@ -409,69 +2657,75 @@ class Desktop:
 
     def on_press(self, key):
         vk = Desktop.__to_vk(key)
-        fk = self.__format_key(vk, True)
-        if fk is not None:
-            self.conn.send(fk)
-            # print(f"Format Key: {fk}")
+        msg = self.__format_key(vk, True)
+        if msg is not None:
+            self.conn.send_bytes(msg)
         return True
 
     def on_release(self, key):
         vk = Desktop.__to_vk(key)
-        fk = self.__format_key(vk, False)
-        if fk is not None:
-            self.conn.send(fk)
-            # print(f"Format Key: {fk}")
+        msg = self.__format_key(vk, False)
+        if msg is not None:
+            self.conn.send_bytes(msg)
         return True
 
     def on_move(self, x, y):
         if x != self.mouse_x or y != self.mouse_y:
             self.mouse_x = x
             self.mouse_y = y
-            self.conn.send(f"M {x} {y}")
+            if self.pointer is not None:
+                self.pointer.write(int(x), int(y), time.perf_counter())
+                return
+            self.conn.send_bytes(MSG.pack(MSG_MOVE, 0, 0, int(x), int(y), time.perf_counter()))
 
     def on_click(self, x, y, button, pressed):
-        if button == Mouse.Button.left and pressed:
-            self.conn.send(f"L {x} {y}")
-        elif button == Mouse.Button.right and pressed:
-            self.conn.send(f"R {x} {y}")
+        if button == self.mouse.Button.left and pressed:
+            self.conn.send_bytes(MSG.pack(MSG_LEFT, 0, 0, int(x), int(y), time.perf_counter()))
+        elif button == self.mouse.Button.right and pressed:
+            self.conn.send_bytes(MSG.pack(MSG_RIGHT, 0, 0, int(x), int(y), time.perf_counter()))
         return True
 
     def on_scroll(self, x, y, dx, dy):
         # print(f"Mouse scroll is: {x}, {y}, {dx}, {dy}")
         return True
-        if key == Keyboard.Key.f1:
-            return 1
-        elif key == Keyboard.Key.f2:
-            return 2
-        elif key == Keyboard.Key.f3:
-            return 3
-        elif key == Keyboard.Key.f4:
-            return 4
-        elif key == Keyboard.Key.f5:
-            return 5
-        elif key == Keyboard.Key.f6:
-            return 6
-        elif key == Keyboard.Key.f7:
-            return 7
-        elif key == Keyboard.Key.f8:
-            return 8
-        elif key == Keyboard.Key.f9:
-            return 9
-        elif key == Keyboard.Key.f10:
-            return 10
-        elif key == Keyboard.Key.f11:
-            return 11
-        elif key == Keyboard.Key.f12:
-            return 12
-        else:
-            return -1
-
-import pygetwindow as gw
 
 class Window:
     def __init__(self, config):
         self.title = config["window"]["title"]
         self.resolution = [int(v) for v in config["window"]["resolution"].split("x")]
+        if "rect" in config["window"]:
+            # fixed [left, top, right, bottom], skips the window lookup
+            self.left_f, self.top_f, self.right_f, self.bottom_f = config["window"]["rect"]
+            self.handle = None
+        else:
+            self.__find()
+        self.__fit()
+
+    def __fit(self):
+        self.left = self.left_f
+        self.right = self.right_f
+        self.bottom = self.bottom_f
+        resolution_aspect = self.resolution[1] / self.resolution[0]
+        self.top = self.bottom - (self.right - self.left) * resolution_aspect
+        self.top = round(self.top)
+        self.calc_window()
+
+    def poll(self):
+        # True when the emulator window moved or resized since the last look
+        if self.handle is None:
+            return False
+        try:
+            rect = (self.handle.left, self.handle.top, self.handle.right, self.handle.bottom)
+        except Exception:
+            return False
+        if rect == (self.left_f, self.top_f, self.right_f, self.bottom_f) or rect[2] <= rect[0]:
+            return False
+        self.left_f, self.top_f, self.right_f, self.bottom_f = rect
+        self.__fit()
+        return True
+
+    def __find(self):
+        import pygetwindow as gw
         targets = [w for w in gw.getWindowsWithTitle(self.title) if self.title in w.title]
         if targets is None or len(targets) == 0:
             print("No window found.")
@@ -484,22 +2738,50 @@ class Window:
             for i in range(len(targets)):
                 print(f"{i}: {targets[i].title}")
             index = int(input("Select a window: "))
+        self.handle = targets[index]
         self.left_f = targets[index].left
         self.top_f = targets[index].top
         self.right_f = targets[index].right
         self.bottom_f = targets[index].bottom
-        self.left = self.left_f
-        self.right = self.right_f
-        self.bottom = self.bottom_f
-        resolution_aspect = self.resolution[1] / self.resolution[0]
-        self.top = self.bottom - (self.right - self.left) * resolution_aspect
-        self.top = round(self.top)
-        self.calc_window()
 
     def calc_window(self):
         self.width = self.right - self.left
         self.height = self.bottom - self.top
         print(f"Window Screen [{self.left}, {self.right}], [{self.top}, {self.bottom}]")
+
+class Transform:
+    # desktop pixels -> window fraction and device ABS units, both affine and fixed until the window changes
+    def __init__(self, left, top, right, bottom, abs_affine):
+        self.left = left
+        self.top = top
+        self.right = right
+        self.bottom = bottom
+        self.sx = 1.0 / (right - left)
+        self.sy = 1.0 / (bottom - top)
+        self.ox = -left * self.sx
+        self.oy = -top * self.sy
+        ax, bx, cx, ay, by, cy = abs_affine
+        self.abs = (
+            ax * self.sx, bx * self.sy, ax * self.ox + bx * self.oy + cx,
+            ay * self.sx, by * self.sy, ay * self.ox + by * self.oy + cy)
+
+    def contains(self, x, y):
+        return self.left < x < self.right and self.top < y < self.bottom
+
+    def frac(self, x, y):
+        return (x * self.sx + self.ox, y * self.sy + self.oy)
+
+    def to_abs(self, x, y):
+        ax, bx, cx, ay, by, cy = self.abs
+        return (int(ax * x + bx * y + cx), int(ay * x + by * y + cy))
+
+    def map_batch(self, xs, ys):
+        # numpy arrays map in one vectorized pass, plain sequences point by point
+        ax, bx, cx, ay, by, cy = self.abs
+        if hasattr(xs, "dtype"):
+            return ((ax * xs + bx * ys + cx).astype("int64"), (ay * xs + by * ys + cy).astype("int64"))
+        return ([int(ax * x + bx * y + cx) for x, y in zip(xs, ys)],
+                [int(ay * x + by * y + cy) for x, y in zip(xs, ys)])
 #endregion
 
 #region Reactor
@@ -510,6 +2792,7 @@ class Reactor:
         self.config = config
         self.adb = adb
         self.mapper = mapper
+        self.mapper.compile(adb)
 
         self.window_left = 0
         self.window_top = 0
@@ -529,168 +2812,562 @@ class Reactor:
         self.player_y = 0
         self.vector_x = 0
         self.vector_y = 0
-        self.vector_x_n = 0
-        self.vector_y_n = 0
-
-    def desktop_start_entry(conn):
-        Desktop().start(conn)
-
-    def __setup_desktop(self):
-        mp.freeze_support()
-        parent_conn, child_conn = mp.Pipe()
-        self.desktop_process = mp.Process(
-            target=Reactor.desktop_start_entry, args=(child_conn,))
-        self.conn = parent_conn
-        self.child_conn = child_conn
-        self.desktop_process.start()
-
-    def loop(self):
+        # pointer distance from the player for a full stick deflection, a fraction of the shorter window side
+        self.player_range = float(config["player"].get("range", 0.25))
+        self.reach_x = 0
+        self.reach_y = 0
+        self.stick_inside = False
+        # swipe_area key while mouse-look is on, the pointer's motion since then in screen fractions
+        self.look = None
+        self.look_x = 0.0
+        self.look_y = 0.0
+        self.look_from = None
+        self.look_sensitivity = float(config.get("look", {}).get("sensitivity", 1.0))
+        # vk -> the Action its press ran, released with the key whatever the modifiers are by then
+        self.held = {}
+
+        # pointer sampling rate, 0 sends every mouse move through the pipe
+        self.tick_hz = config.get("tick_hz", 120)
+        self.tracer = adb.tracer
+        # targets sharing a group mirror each other's input in broadcast routing
+        self.group = config.get("group")
+
+    def attach(self):
         self.win = Window(self.config)
         self.__calc_window()
-        self.__setup_desktop()
-        print("Start Running...")
+        if self.adb.screen is not None:
+            self.adb.screen.start()
+        # 0 keeps the geometry found at startup
+        interval = float(self.config["window"].get("watch_ms", 1000)) / 1000
+        if self.win.handle is not None and interval > 0:
+            threading.Thread(target=self.__watch_geometry, args=(interval,), daemon=True).start()
+
+    def __watch_geometry(self, interval):
         while True:
-            msg = self.conn.recv()
-            if msg == "exit":
-                self.desktop_process.terminate()
-                break
-            try:
-                self.__act(msg)
-            except Exception as e:
-                print(f"Error: {e}")
-                debug_traceback(e)
+            time.sleep(interval)
+            if self.win.poll():
+                self.__calc_window()
+
+    def contains(self, x, y):
+        return self.transform.contains(x, y)
+
+    def mirror(self, x, y, other):
+        # the same relative position inside another target's window
+        win, dst = self.win, other.win
+        return (dst.left + (x - win.left) * dst.width // win.width,
+                dst.top + (y - win.top) * dst.height // win.height)
+
+    def reload(self, config):
+        keys = config.get("keys") if isinstance(config, dict) else None
+        if not isinstance(keys, dict):
+            print(f"Rejected {self.config['name']}: no keys block, keeping the live keymap")
+            return False
+        return self.mapper.reload(self.adb, keys)
 
-    def __act(self, fk):
-        release = False
-        if fk[0] == "!":
-            release = True
-            fk = fk[1:]
-        if self.__act_util(fk, release):
-            return
-        if self.__act_mouse(fk, release):
-            return
-        if self.__act_key(fk, release):
-            return
+    def loop(self, entry=None):
+        Router([self]).loop(entry)
+
+    def replay(self, path, speed=1.0):
+        Router([self]).replay(path, speed)
+
+    def dispatch(self, t, mods, vk, x, y, ts):
+        tracer = self.tracer
+        if tracer is not None:
+            tracer.record(MSG_NAMES[t], "ipc", ts)
+        try:
+            self.__act(t, mods, vk, x, y, ts)
+        except Exception as e:
+            print(f"Error: {e}")
+            debug_traceback(e)
+        if tracer is not None:
+            tracer.record(MSG_NAMES[t], "dispatch", ts)
+
+    def __act(self, t, mods, vk, x, y, ts):
+        if t == MSG_KEY_DOWN or t == MSG_KEY_UP:
+            release = t == MSG_KEY_UP
+            if self.__act_util(vk, mods, release):
+                return
+            self.__act_key(vk, mods, release, ts)
+        else:
+            self.__act_mouse(t, x, y, ts)
 
     def __calc_window(self):
         self.win.calc_window()
+        win = self.win
+        # swapped whole, the dispatch path never sees half a geometry
+        self.transform = Transform(win.left, win.top, win.right, win.bottom, self.adb.abs_affine)
         self.player_x = int(self.win.width * self.player_x_pct)
         self.player_y = int(self.win.height * self.player_y_pct)
+        reach = self.player_range * min(win.width, win.height)
+        self.reach_x = win.width / reach
+        self.reach_y = win.height / reach
         print(f"Player position is: {self.player_x}, {self.player_y}")
 
-    def __act_util(self, fk, release):
-        if fk == "CSAi":
+    def __act_util(self, vk, mods, release):
+        if release or mods != MOD_CTRL | MOD_SHIFT | MOD_ALT:
+            return False
+        if vk == 0x49:
             # ctrl + shift + alt + i
             self.win.left = self.mouse_x
             self.win.top = self.mouse_y
             self.__calc_window()
             print(f"Window Left-Top is: {self.mouse_x}, {self.mouse_y}")
             return True
-        elif fk == "CSAo":
+        elif vk == 0x4F:
             # ctrl + shift + alt + o
             self.win.right = self.mouse_x
             self.win.bottom = self.mouse_y
             self.__calc_window()
             print(f"Window Right-Bottom is: {self.mouse_x}, {self.mouse_y}")
             return True
+        elif vk == 0x4C:
+            # ctrl + shift + alt + l
+            if self.tracer is not None:
+                self.tracer.dump()
+            else:
+                print("Latency tracing is off, set \"trace\": true in configs.json")
+            print(overload_report([(f"{self.config['name']} queue", self.adb.scheduler.stats())]))
+            print(lateness_report([(self.config["name"], self.adb.timers.late)]))
+            if self.adb.screen is not None:
+                print(self.adb.screen.report())
+            return True
         else:
             return False
 
-    def __unformat_key(self, fk):
-        is_ctrl = False
-        is_shift = False
-        is_alt = False
-        is_fn = False
-        if fk.startswith("C"):
-            fk = fk[1:]
-            is_ctrl = True
-        if fk.startswith("S"):
-            fk = fk[1:]
-            is_shift = True
-        if fk.startswith("A"):
-            fk = fk[1:]
-            is_alt = True
-        if fk.startswith("F"):
-            fk = fk[1:]
-            is_fn = True
-        return fk, is_ctrl, is_shift, is_alt, is_fn
-
-    def __normalize(self, x, y, factor=1):
-        x2 = x ** 2
-        y2 = y ** 2
-        sr = math.sqrt(x2 + y2)
-        if sr < 0.001:
-            return 0, 0
-        return x * factor / sr, y * factor / sr
-
-    def __act_key(self, fk, release):
+    def __act_key(self, vk, mods, release, ts):
         if release:
+            act = self.held.pop(vk, None)
+            if act is not None:
+                act.release(ts)
+            return
+        if vk in self.held:
+            # auto-repeat of a held key, its action is already running
             return
-        k, is_ctrl, is_shift, is_alt, is_fn = self.__unformat_key(fk)
-        act = self.mapper.map(k)
-        if k == "y":
-            self.adb.execute("touch_start", 1, 2, 3)
-        if k == "u":
-            self.adb.execute("touch_end", 1)
+        act = self.mapper.table[vk << 3 | mods]
         if act is None:
             return
-        act_type = act[0]
-        # debug
-        if act_type == "click":
-            self.adb.execute("click", act[1], act[2])
-        elif act_type == "swipe":
-            self.adb.execute("swipe", act[1], act[2], act[3], act[4])
-        elif act_type == "swipe_direction":
-            self.adb.execute("swipe_diff", act[1], act[2], act[3], act[4])
-        elif act_type == "swipe_area":
-            self.adb.execute("swipe_area", act[1], act[2])
-        elif act_type == "pad" and not release:
-            self.adb.execute("touch_end", self.mapper.pad_stop())
-        else:
-            print(f"Unknown action: {act_type}")
-
-    def __act_mouse(self, fk, release):
-        is_move = fk.startswith("M")
-        is_left = fk.startswith("L")
-        is_right = fk.startswith("R")
-        if is_move or is_left or is_right:
-            fk = fk.split()
-            x = int(fk[1])
-            y = int(fk[2])
-        else:
-            return False
+        if act.condition is not None and not self.__screen_shows(act):
+            return
+        self.held[vk] = act
+        act(ts)
+        if act.fn == "look_toggle":
+            self.__look_toggle(act.key, ts)
+
+    def __look_toggle(self, key, ts):
+        if self.look is not None and self.look != key:
+            # one mouse-look at a time, the other one's finger is lifted
+            self.adb.execute("look_toggle", self.look, 0, 0, origin=ts)
+        self.look = None if self.look == key else key
+        self.look_x = 0.0
+        self.look_y = 0.0
+        self.look_from = None
+
+    def __screen_shows(self, act):
+        # "if" skips the action unless the region shows, "when" runs it once the region shows up
+        mode, region, timeout = act.condition
+        screen = self.adb.screen
+        if screen.matched.get(region, False):
+            return True
+        if mode == "when":
+            screen.wait(region, act.fn, act.args, timeout)
+        return False
+
+    def __act_mouse(self, t, x, y, ts):
+        is_left = t == MSG_LEFT
+        is_right = t == MSG_RIGHT
         self.mouse_x = x
         self.mouse_y = y
-        if x <= self.win.left or x >= self.win.right or y <= self.win.top or y >= self.win.bottom:
+        if self.look is not None:
+            # mouse-look takes the pointer: once per pointer tick, its motion so far
+            last = self.look_from
+            self.look_from = (x, y)
+            if last is not None and (x != last[0] or y != last[1]):
+                win = self.win
+                self.look_x += (x - last[0]) * self.look_sensitivity / win.width
+                self.look_y += (y - last[1]) * self.look_sensitivity / win.height
+                self.adb.execute("look_to", self.look, self.look_x, self.look_y, origin=ts)
             return True
-        self.mouse_x_in = float(x - self.win.left) / float(self.win.width)
-        self.mouse_y_in = float(y - self.win.top) / float(self.win.height)
+        transform = self.transform
+        pad = self.mapper.pad_stop()
+        if not transform.contains(x, y):
+            if self.stick_inside and pad is not None:
+                # leaving the window centers and releases the stick
+                self.stick_inside = False
+                self.adb.execute("stick_release", pad, origin=ts)
+            return True
+        self.mouse_x_in, self.mouse_y_in = transform.frac(x, y)
         self.vector_x = self.mouse_x_in - self.player_x_pct
         self.vector_y = self.mouse_y_in - self.player_y_pct
-        self.vector_x_n, self.vector_y_n = self.__normalize(self.vector_x, self.vector_y)
-        # print(f"Vector is: {self.vector_x_n}, {self.vector_y_n}")
         # print(f"Mouse position is: {self.mouse_x_in}, {self.mouse_y_in}")
         if is_left:
             # todo
             pass
-        if is_right and not release:
+        if is_right:
             pass
             # self.__act_mouse_right()
-        self.adb.execute("touch_move", self.vector_x_n, self.vector_y_n)
+        if pad is not None:
+            self.stick_inside = True
+            self.adb.execute("stick_move", pad, self.vector_x * self.reach_x, self.vector_y * self.reach_y, origin=ts)
         return True
 
     def __act_mouse_right(self):
         pad = self.mapper.pad()
         # self.adb.touch_start(self.mapper.pad_stop(), pad[1], pad[2])
 
+class Router:
+    # one Desktop listener fanned out to Reactor/Adb pairs, each with its own window and injection worker
+    # "focus" routes to the target under the pointer or in the foreground,
+    # "broadcast" mirrors input to every target in the focused target's group
+    def __init__(self, reactors, route="focus"):
+        self.reactors = reactors
+        self.route = route
+        self.focus = reactors[0]
+        self.tick_hz = reactors[0].tick_hz
+        self.pointer = None
+        self.recorder = None
+        # the running event loop of the asyncio core
+        self.event_loop = None
+        groups = {}
+        for reactor in reactors:
+            groups.setdefault(reactor.group, []).append(reactor)
+        self.members = {reactor: groups[reactor.group] for reactor in reactors}
+        # vk -> reactors its key down went to, for the key up
+        self.pressed = {}
+        # messages the listener sent while dispatch was behind: stale key downs and clicks expire, moves collapse
+        adb = reactors[0].config["adb"]
+        self.inbox = Channel(
+            int(adb.get("queue_depth", 256)), "drop_oldest",
+            float(adb.get("move_deadline_ms", 100)) / 1000,
+            float(adb.get("press_deadline_ms", 1000)) / 1000)
+
+    def desktop_start_entry(conn, pointer):
+        Desktop().start(conn, pointer)
+
+    def __setup_desktop(self, entry):
+        mp.freeze_support()
+        parent_conn, child_conn = mp.Pipe(duplex=False)
+        if self.tick_hz > 0:
+            self.pointer = PointerSlot()
+        self.desktop_process = mp.Process(
+            target=entry, args=(child_conn, self.pointer))
+        self.conn = parent_conn
+        self.child_conn = child_conn
+        self.desktop_process.start()
+
+    def __attach(self):
+        for reactor in self.reactors:
+            reactor.attach()
+        if len(self.reactors) > 1 and any([r.win.handle is not None for r in self.reactors]):
+            threading.Thread(target=self.__watch_focus, daemon=True).start()
+
+    def __watch_focus(self, interval=0.25):
+        # follows the foreground window, the pointer still moves focus in between
+        try:
+            import pygetwindow as gw
+            active = gw.getActiveWindow
+        except Exception:
+            return
+        last = None
+        while True:
+            try:
+                w = active()
+            except Exception:
+                w = None
+            if w is not None and w != last:
+                last = w
+                for reactor in self.reactors:
+                    if reactor.win.handle is not None and reactor.win.handle == w:
+                        self.focus = reactor
+                        print(f"Focus: {reactor.config['name']}")
+            time.sleep(interval)
+
+    def loop(self, entry=None):
+        # entry runs in the listener process with (conn, pointer), the pynput Desktop by default
+        self.__attach()
+        self.__setup_desktop(entry or Router.desktop_start_entry)
+        print("Start Running...")
+        buf = bytearray(MSG.size)
+        tick = 1.0 / self.tick_hz if self.tick_hz > 0 else 0
+        next_tick = time.perf_counter()
+        pointer_seq = 0
+        while True:
+            if self.pointer is not None:
+                now = time.perf_counter()
+                if now >= next_tick:
+                    next_tick += tick
+                    if next_tick < now:
+                        next_tick = now + tick
+                    seq, x, y, ts = self.pointer.read()
+                    if seq != pointer_seq:
+                        pointer_seq = seq
+                        self.dispatch(MSG_MOVE, 0, 0, x, y, ts)
+                    continue
+                if not self.conn.poll(next_tick - now):
+                    continue
+            done = False
+            while not done:
+                self.conn.recv_bytes_into(buf)
+                done = not self.__enqueue(MSG.unpack_from(buf))
+                if not self.conn.poll():
+                    break
+            self.__deliver()
+            if done:
+                self.desktop_process.terminate()
+                break
+
+    def record(self, path):
+        self.recorder = Recorder(path)
+        print(f"Recording to {path}")
+
+    def __replay_events(self, path, speed):
+        # (delay, message), speed 0 runs as fast as possible
+        start = None
+        for t, mods, vk, x, y, ts in read_records(path):
+            if t == MSG_EXIT:
+                continue
+            delay = 0
+            if speed > 0:
+                if start is None:
+                    start = (time.perf_counter(), ts)
+                delay = start[0] + (ts - start[1]) / speed - time.perf_counter()
+            yield delay, (t, mods, vk, x, y)
+
+    def replay(self, path, speed=1.0):
+        # feeds a recording through the live dispatch path
+        self.__attach()
+        print(f"Replaying {path}...")
+        count = 0
+        for delay, msg in self.__replay_events(path, speed):
+            if delay > 0:
+                time.sleep(delay)
+            self.dispatch(*msg, time.perf_counter())
+            count += 1
+        print(f"Replayed {count} events")
+
+    async def run(self, entry=None, replay=None, speed=1.0):
+        # the asyncio core: IPC reads, pointer ticks, injection and gesture timers share one event loop,
+        # loop() and replay() remain the thread based runtime
+        loop = asyncio.get_running_loop()
+        self.event_loop = loop
+        for reactor in self.reactors:
+            reactor.adb.start_async(loop)
+        if replay is not None:
+            self.__attach()
+            print(f"Replaying {replay}...")
+            count = 0
+            for delay, msg in self.__replay_events(replay, speed):
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self.dispatch(*msg, time.perf_counter())
+                count += 1
+            print(f"Replayed {count} events")
+        else:
+            await self.__listen(loop, entry)
+        for reactor in self.reactors:
+            await reactor.adb.scheduler.idle()
+
+    async def __listen(self, loop, entry):
+        self.__attach()
+        self.__setup_desktop(entry or Router.desktop_start_entry)
+        print("Start Running...")
+        self.done = loop.create_future()
+        self.buf = bytearray(MSG.size)
+        fd = self.conn.fileno()
+        try:
+            loop.add_reader(fd, self.__readable)
+        except NotImplementedError:
+            # proactor loops can't watch a pipe handle, one thread reads and hands messages over
+            fd = None
+            threading.Thread(target=self.__pump, args=(loop,), daemon=True).start()
+        if self.pointer is not None:
+            self.pointer_seq = 0
+            loop.call_soon(self.__sample, loop, loop.time(), 1.0 / self.tick_hz)
+        await self.done
+        if fd is not None:
+            loop.remove_reader(fd)
+        self.desktop_process.terminate()
+
+    def __readable(self):
+        try:
+            while not self.done.done() and self.conn.poll():
+                self.conn.recv_bytes_into(self.buf)
+                if not self.__enqueue(MSG.unpack_from(self.buf)):
+                    self.done.set_result(None)
+        except (EOFError, OSError):
+            self.done.set_result(None)
+        self.__deliver()
+
+    def __pump(self, loop):
+        buf = bytearray(MSG.size)
+        while True:
+            try:
+                self.conn.recv_bytes_into(buf)
+            except (EOFError, OSError):
+                loop.call_soon_threadsafe(self.__receive, (MSG_EXIT, 0, 0, 0, 0, 0))
+                return
+            msg = MSG.unpack_from(buf)
+            loop.call_soon_threadsafe(self.__receive, msg)
+            if msg[0] == MSG_EXIT:
+                return
+
+    def __receive(self, msg):
+        if self.done.done():
+            return
+        if not self.__enqueue(msg):
+            self.done.set_result(None)
+        self.__deliver()
+
+    def __enqueue(self, msg):
+        # False on exit
+        t, mods, vk, x, y, ts = msg
+        if t == MSG_EXIT:
+            return False
+        self.inbox.put(MSG_CLASSES[t], t, msg, vk if t <= MSG_KEY_UP else -1, ts, ts)
+        return True
+
+    def __deliver(self):
+        for t, msg, ts in self.inbox.take(time.perf_counter()):
+            self.dispatch(*msg)
+
+    def __sample(self, loop, due, tick):
+        if self.done.done():
+            return
+        seq, x, y, ts = self.pointer.read()
+        if seq != self.pointer_seq:
+            self.pointer_seq = seq
+            self.dispatch(MSG_MOVE, 0, 0, x, y, ts)
+        due = max(due + tick, loop.time())
+        loop.call_at(due, self.__sample, loop, due, tick)
+
+    def wait_idle(self):
+        for reactor in self.reactors:
+            reactor.adb.scheduler.wait_idle()
+
+    def overload(self):
+        channels = [("inbox", self.inbox.stats())]
+        for reactor in self.reactors:
+            channels.append((f"{reactor.config['name']} queue", reactor.adb.scheduler.stats()))
+        print(overload_report(channels))
+        print(lateness_report([(reactor.config["name"], reactor.adb.timers.late) for reactor in self.reactors]))
+        for reactor in self.reactors:
+            if reactor.adb.screen is not None:
+                print(f"{reactor.config['name']} {reactor.adb.screen.report()}")
+
+    def reload(self, configs):
+        # from the config watcher, bindings of each running environment are diffed against its live keymap
+        if self.event_loop is not None and not self.event_loop.is_closed():
+            # the async scheduler belongs to the loop thread
+            self.event_loop.call_soon_threadsafe(self.__reload, configs)
+        else:
+            self.__reload(configs)
+
+    def __reload(self, configs):
+        if not isinstance(configs, list):
+            print("Rejected configs.json edit: expected a list of environments")
+            return
+        by_name = {c.get("name"): c for c in configs if isinstance(c, dict)}
+        for reactor in self.reactors:
+            name = reactor.config["name"]
+            if name not in by_name:
+                print(f"Environment {name} is gone from configs.json, keeping its keymap")
+                continue
+            reactor.reload(by_name[name])
+
+    def dispatch(self, t, mods, vk, x, y, ts):
+        if self.recorder is not None:
+            self.recorder.record(t, mods, vk, x, y, ts)
+        focus = self.focus
+        if len(self.reactors) == 1:
+            focus.dispatch(t, mods, vk, x, y, ts)
+            return
+        pointer = t >= MSG_MOVE
+        if pointer and not focus.contains(x, y):
+            for reactor in self.reactors:
+                if reactor.contains(x, y):
+                    focus = self.focus = reactor
+                    break
+        if t == MSG_KEY_UP and vk in self.pressed:
+            # the release goes where the press went, focus may have moved while the key was held
+            for reactor in self.pressed.pop(vk):
+                reactor.dispatch(t, mods, vk, x, y, ts)
+            return
+        targets = [focus] if self.route != "broadcast" else self.members[focus]
+        if t == MSG_KEY_DOWN:
+            held = self.pressed.setdefault(vk, [])
+            held.extend([reactor for reactor in targets if reactor not in held])
+        for reactor in targets:
+            if pointer and reactor is not focus:
+                mx, my = focus.mirror(x, y, reactor)
+                reactor.dispatch(t, mods, vk, mx, my, ts)
+            else:
+                reactor.dispatch(t, mods, vk, x, y, ts)
+
 #endregion
 
 if __name__ == "__main__":
-    config = __System_Config__()
-    print(f"Using environment: {config['name']}")
-    mapper = Mapper(config)
-    adb = Adb(config)
-    reactor = Reactor(config, adb, mapper)
-    reactor.loop()
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bootstrap", action="store_true", help="install dependencies and exit")
+    parser.add_argument("--config", help="path to configs.json")
+    parser.add_argument("--refresh", action="store_true", help="ignore the cached device profile and rediscover")
+    parser.add_argument("--record", help="append the input session to this file")
+    parser.add_argument("--replay", help="play a recorded session instead of listening to input")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed, 0 for as fast as possible")
+    parser.add_argument("--targets", help="drive several environments from one listener, \"all\" or comma separated names")
+    parser.add_argument("--route", default="focus", help="multi-target routing, focus or broadcast")
+    parser.add_argument("--sync", action="store_true", help="thread based runtime instead of the asyncio core")
+    parser.add_argument("--probe", nargs="?", const="", help="measure injection -> device latency and loss with getevent, for these backends (comma separated, the configured one by default), then exit")
+    parser.add_argument("--probe-count", type=int, default=200, help="taps per probed backend")
+    args = parser.parse_args()
+    if args.bootstrap:
+        bootstrap()
+        exit()
+    if args.sync or args.probe is not None:
+        # the thread runtime's timer wheel waits for the GIL up to the switch interval, 5 ms by default, behind busy threads.
+        # the asyncio core fires its timers on the loop thread and keeps the default
+        sys.setswitchinterval(0.001)
+    if args.targets:
+        configs = __System_Configs__(args.config, args.targets)
+    else:
+        configs = [__System_Config__(args.config)]
+    if args.probe is not None:
+        # the probe taps along the middle of the top edge of the screen as the game sees it, run it somewhere harmless
+        config = configs[0]
+        config["trace"] = True
+        report = LatencyTracer()
+        for backend in args.probe.split(",") if args.probe else [config["adb"].get("backend", "shell")]:
+            config["adb"]["backend"] = backend
+            adb = Adb(config, args.refresh)
+            LoopbackProbe(adb, args.probe_count).run()
+            report.merge(adb.tracer, backend)
+        report.dump()
+        exit()
+    import atexit
+    reactors = []
+    for config in configs:
+        print(f"Using environment: {config['name']}")
+        mapper = Mapper(config)
+        adb = Adb(config, args.refresh)
+        if adb.tracer is not None:
+            atexit.register(adb.tracer.dump)
+        reactors.append(Reactor(config, adb, mapper))
+    router = Router(reactors, args.route)
+    if any([r.tracer is not None for r in reactors]):
+        atexit.register(router.overload)
+    # 0 turns off watching configs.json for binding edits
+    reload_interval = float(configs[0].get("reload_ms", 1000)) / 1000
+    if reload_interval > 0:
+        ConfigWatcher(args.config, router.reload, reload_interval).start()
+    if args.record:
+        router.record(args.record)
+        atexit.register(router.recorder.close)
+    if not args.sync:
+        asyncio.run(router.run(replay=args.replay, speed=args.speed))
+        exit()
+    if args.replay:
+        router.replay(args.replay, args.speed)
+        router.wait_idle()
+        exit()
+    router.loop()
     while True:
         time.sleep(1)